@@ -1,8 +1,45 @@
 import abc
+import contextlib
+import functools
+import heapq
+import itertools
+import math
+import operator
+import os
+import threading
+import typing
 from student_mark.domains import models
+from student_mark.utils import io
+
+# NumPy is imported by the methods that use it, so importing the
+# repositories does not pay for it.
+if typing.TYPE_CHECKING:
+    import numpy as np
+
+
+class DuplicateStudentId(Exception):
+    pass
+
+
+def gpas_from_totals(total_credits, weighted_sums) -> "np.ndarray":
+    """GPAs, rounded like Student.gpa(), from credit_totals() arrays."""
+    import numpy as np
+
+    gpas = np.zeros(len(total_credits), dtype=np.float64)
+    np.divide(weighted_sums, total_credits, out=gpas, where=total_credits != 0)
+    # np.round rounds gpas * 10, which can land a GPA that is just off a
+    # half on the other side of it; the built-in round decides on the
+    # exact value. Only GPAs within an ulp of a half can differ.
+    scaled = gpas * 10
+    rounded = np.round(gpas, 1)
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= np.spacing(np.abs(scaled))
+    rounded[near_half] = [round(gpa, 1) for gpa in gpas[near_half].tolist()]
+    return rounded
 
 
 class AbstractRepository(abc.ABC):
+    catalog: models.Catalog
+
     @abc.abstractmethod
     def add(self, student: models.Student):
         raise NotImplementedError
@@ -11,16 +48,374 @@ class AbstractRepository(abc.ABC):
     def get(self, id) -> models.Student:
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def list(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def remove(self, id):
+        raise NotImplementedError
+
+    def lock(self, student_id=None, exclusive=False):
+        """Context manager guarding one student, or the whole repository when student_id is None.
+
+        Handlers hold it around each read or change. Repositories that are
+        not shared between threads need no locking.
+        """
+        return contextlib.nullcontext()
+
+    def begin(self):
+        """Start grouping the changes that follow, until commit() or rollback().
+
+        For repositories that write each change through to storage, so a
+        unit of work is stored atomically. Others have nothing to do.
+        """
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def add_course(self, student: models.Student, course: models.Course):
+        student.add_course(course)
+
+    def remove_course(self, student: models.Student, course: models.Course):
+        student.remove_course(course)
+
+    def update_course_mark(
+        self, student: models.Student, course: models.Course, mark: float
+    ):
+        student.update_course_mark(course, mark)
+
+    def update_course_marks(self, students, courses, marks):
+        """update_course_mark() for each student, course and mark of the three lists."""
+        for student, course, mark in zip(students, courses, marks):
+            self.update_course_mark(student, course, mark)
+
+    def gpas(self) -> "np.ndarray":
+        """GPA of every student, in the same order as list()."""
+        import numpy as np
+
+        return np.array([student.gpa() for student in self.list()], dtype=float)
+
+    def credit_totals(self):
+        """(total credit, credit-weighted mark sum) arrays of every student, in list() order."""
+        import numpy as np
+
+        students = self.list()
+        return (
+            np.fromiter(map(operator.attrgetter("total_credit"), students), np.float64),
+            np.fromiter(map(operator.attrgetter("weighted_sum"), students), np.float64),
+        )
+
+    def gpa(self, student_id):
+        """GPA of one student, or None if there is no such student."""
+        student = self.get(student_id)
+        return None if student is None else student.gpa()
+
+    def course_students(self, course_id):
+        """Students enrolled in course_id, each once."""
+        return [
+            student
+            for student in self.list()
+            if any(course.entry.id == course_id for course in student.courses)
+        ]
+
+    def ranked(self, limit=None, offset=0):
+        """Students by GPA, best first and ties in list() order; limit of them from offset."""
+        if limit is None:
+            import numpy as np
+
+            students = np.array(list(self.list()), dtype=object)
+            return students[np.argsort(-self.gpas(), kind="stable")][offset:]
+        # The negative counter ranks earlier students higher on ties and
+        # stops the comparison before it reaches the Student objects.
+        ranked = heapq.nlargest(
+            offset + limit, zip(self.gpas().tolist(), itertools.count(0, -1), self.list())
+        )
+        return [student for _, _, student in ranked[offset:]]
+
 
 class LocalRepository(AbstractRepository):
     def __init__(self, students):
-        self._students = set(students)
+        self.catalog = models.Catalog()
+        self._students = {}
+        # Course id -> {student id: student}, built by the first
+        # course_students() call and kept up to date from then on.
+        self._enrolled = None
+        for student in students:
+            self.add(student)
+
+    def add(self, student):
+        if student.id in self._students:
+            raise DuplicateStudentId(f"Duplicate student ID {student.id}")
+        self._students[student.id] = student
+        if self._enrolled is not None:
+            for course in student.courses:
+                self._enroll(student, course)
+
+    def get(self, id):
+        return self._students.get(id)
+
+    def list(self):
+        return self._students.values()
+
+    def remove(self, id):
+        student = self._students.pop(id)
+        if self._enrolled is not None:
+            for course in student.courses:
+                self._enrolled[course.id].pop(id, None)
+
+    def add_course(self, student, course):
+        super().add_course(student, course)
+        if self._enrolled is not None:
+            self._enroll(student, course)
+
+    def remove_course(self, student, course):
+        super().remove_course(student, course)
+        if self._enrolled is not None and not any(c.id == course.id for c in student.courses):
+            del self._enrolled[course.id][student.id]
+
+    def course_students(self, course_id):
+        if self._enrolled is None:
+            self._enrolled = {}
+            for student in self._students.values():
+                for course in student.courses:
+                    self._enroll(student, course)
+        return list(self._enrolled.get(course_id, {}).values())
+
+    def _enroll(self, student, course):
+        self._enrolled.setdefault(course.id, {})[student.id] = student
+
+
+class RWLock:
+    """Readers/writer lock. Waiting writers hold off new readers so they are not starved."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class ConcurrentRepository(LocalRepository):
+    """LocalRepository that can be shared between threads.
+
+    Students hash onto a fixed set of striped readers/writer locks, so
+    threads working on different students do not wait for each other.
+    Those all hold the repository-wide lock shared; lock(exclusive=True)
+    without a student takes it alone, giving list_students a consistent
+    view.
+    """
+
+    def __init__(self, students, stripes=64):
+        self._lock = RWLock()
+        self._stripes = [RWLock() for _ in range(stripes)]
+        super().__init__(students)
+
+    def lock(self, student_id=None, exclusive=False):
+        if student_id is None:
+            return self._lock.write() if exclusive else self._lock.read()
+        return self._student_lock(student_id, exclusive)
+
+    @contextlib.contextmanager
+    def _student_lock(self, student_id, exclusive):
+        stripe = self._stripes[hash(student_id) % len(self._stripes)]
+        with self._lock.read(), (stripe.write() if exclusive else stripe.read()):
+            yield
+
+
+class ColumnarRepository(LocalRepository):
+    """Mirrors every enrollment into NumPy columns so gpas() is one vectorized pass.
+
+    Student rows follow insertion order, so they line up with list().
+    """
+
+    def __init__(self, students, capacity=1024):
+        import numpy as np
+
+        self._rows = {}
+        self._positions = {}
+        self._size = 0
+        self._owners = np.zeros(capacity, dtype=np.int64)
+        self._credits = np.zeros(capacity, dtype=np.float64)
+        self._marks = np.zeros(capacity, dtype=np.float64)
+        super().__init__(students)
+
+    def add(self, student):
+        super().add(student)
+        self._rows[student.id] = len(self._rows)
+        for course in student.courses:
+            self._append(student, course)
+
+    def add_course(self, student, course):
+        super().add_course(student, course)
+        self._append(student, course)
+
+    def remove(self, id):
+        student = self.get(id)
+        super().remove(id)
+        for course in reversed(student.courses):
+            self._clear(course)
+        # Later students move up a row to stay lined up with list().
+        row = self._rows.pop(id)
+        owners = self._owners[: self._size]
+        owners[owners > row] -= 1
+        for other in itertools.islice(self._rows, row, None):
+            self._rows[other] -= 1
+        if not self._rows:
+            self._size = 0
+
+    def remove_course(self, student, course):
+        super().remove_course(student, course)
+        self._clear(course)
+
+    def update_course_mark(self, student, course, mark):
+        super().update_course_mark(student, course, mark)
+        self._marks[self._positions[course]] = mark
+
+    def update_course_marks(self, students, courses, marks):
+        for student, course, mark in zip(students, courses, marks):
+            student.update_course_mark(course, mark)
+        self._marks[[self._positions[course] for course in courses]] = marks
+
+    def gpas(self):
+        return gpas_from_totals(*self.credit_totals())
+
+    def credit_totals(self):
+        import numpy as np
+
+        size = self._size
+        owners = self._owners[:size]
+        credits = self._credits[:size]
+        total_credits = np.bincount(owners, weights=credits, minlength=len(self._rows))
+        weighted_sums = np.bincount(
+            owners, weights=credits * self._marks[:size], minlength=len(self._rows)
+        )
+        return total_credits, weighted_sums
+
+    def _append(self, student, course):
+        if self._size == len(self._owners):
+            import numpy as np
+
+            capacity = max(1, 2 * len(self._owners))
+            self._owners = np.resize(self._owners, capacity)
+            self._credits = np.resize(self._credits, capacity)
+            self._marks = np.resize(self._marks, capacity)
+        self._owners[self._size] = self._rows[student.id]
+        self._credits[self._size] = course.credit
+        self._marks[self._size] = course.mark
+        self._positions[course] = self._size
+        self._size += 1
+
+    def _clear(self, course):
+        # A zero credit drops the enrollment out of both sums in gpas().
+        position = self._positions.pop(course)
+        self._owners[position] = 0
+        self._credits[position] = 0
+        self._marks[position] = 0
+        if position == self._size - 1:
+            self._size -= 1
+
+
+class LazyTextRepository(AbstractRepository):
+    """Reads students from the text data files on demand through their offset indexes."""
+
+    def __init__(self, data_dir):
+        self._files = {}
+        self._indexes = {}
+        for name in ("students.txt", "courses.txt", "marks.txt"):
+            path = os.path.join(data_dir, name)
+            self._indexes[name] = io.load_index(path)
+            if os.path.exists(path):
+                self._files[name] = open(path, "rb")
+        self._loaded = {}
+        self._students = {}
+
+    @functools.cached_property
+    def catalog(self):
+        # Every course in courses.txt is catalogued on first use, in file
+        # order, so a new enrollment is checked against the courses of
+        # students not loaded yet.
+        catalog = models.Catalog()
+        file = self._files.get("courses.txt")
+        if file is not None:
+            file.seek(0)
+            for line in file:
+                data = line.decode().strip().split(" ")
+                if len(data) >= 4:
+                    catalog.entry(data[1], data[2], int(data[3]))
+        return catalog
 
     def add(self, student):
-        self._students.add(student)
+        if self.get(student.id) is not None:
+            raise DuplicateStudentId(f"Duplicate student ID {student.id}")
+        self._students[student.id] = student
 
     def get(self, id):
-        return next((s for s in self._students if s.id == id), None)
+        if id in self._students:
+            return self._students[id]
+        if id not in self._loaded:
+            if id not in self._indexes["students.txt"]:
+                return None
+            self._loaded[id] = self._load(id)
+        return self._loaded[id]
 
     def list(self):
-        return self._students
+        return [self.get(id) for id in self._indexes["students.txt"]] + list(
+            self._students.values()
+        )
+
+    def remove(self, id):
+        # Only students added since the files were indexed can be removed.
+        del self._students[id]
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+
+    def _lines(self, name, id):
+        for offset in self._indexes[name].get(id, []):
+            yield io.read_line_at(self._files[name], offset)
+
+    def _load(self, id):
+        record = next(self._lines("students.txt", id))
+        courses = [
+            models.Course(self.catalog.entry(data[1], data[2], int(data[3])))
+            for data in self._lines("courses.txt", id)
+        ]
+        for data in self._lines("marks.txt", id):
+            course = next((c for c in courses if c.id == data[1]), None)
+            if course is not None:
+                course.mark = math.floor(float(data[2]))
+        return models.Student(record[0], record[1], record[2], courses=courses)
@@ -0,0 +1,206 @@
+"""Students partitioned by id hash across worker processes.
+
+Each worker owns a LocalRepository holding its share of the students and
+runs the command handlers against it. ShardedRepository routes a command
+to the shard owning its student, and answers rankings by gathering each
+shard's best students and merging them. GPA distributions are computed
+from every shard's credit totals. Workers live in other processes,
+so it executes commands rather than handing out Student objects.
+"""
+import heapq
+import itertools
+import multiprocessing
+import zlib
+from student_mark.adapters import repositories
+from student_mark.domains import commands
+from student_mark.service_layer.handlers import (
+    COMMANDS_HANDLERS,
+    InvalidPage,
+    check_course_marks,
+    check_page,
+    summarize_gpas,
+)
+
+
+def shard_of(student_id, shards):
+    # crc32 rather than hash(), which differs between processes.
+    return zlib.crc32(str(student_id).encode()) % shards
+
+
+def _ranking(repo, created, limit):
+    # Sorted (-gpa, creation order, student) triples, best first, so the
+    # router can merge shards and keep list_students' tie order.
+    with repo.lock(exclusive=True):
+        ranked = zip(
+            (-gpa for gpa in repo.gpas().tolist()),
+            (created[student.id] for student in repo.list()),
+            repo.list(),
+        )
+        if limit is None:
+            return sorted(ranked, key=lambda item: item[:2])
+        return heapq.nsmallest(limit, ranked, key=lambda item: item[:2])
+
+
+def _worker(connection):
+    repo = repositories.LocalRepository([])
+    created = {}
+    while True:
+        message = connection.recv()
+        if message is None:
+            return
+        operation, payload = message
+        if operation == "handle":
+            results = []
+            for cmd, order in payload:
+                try:
+                    results.append((COMMANDS_HANDLERS[type(cmd)](cmd, repo), None))
+                    if isinstance(cmd, commands.CreateStudent):
+                        created[cmd.id] = order
+                except Exception as e:
+                    # Any failure is that command's error; letting it
+                    # escape would end the worker and lose its students.
+                    results.append((None, e))
+            connection.send(results)
+        elif operation == "check":
+            try:
+                with repo.lock(exclusive=True):
+                    check_course_marks(payload, repo)
+                connection.send(None)
+            except Exception as e:
+                connection.send(e)
+        elif operation == "ranking":
+            connection.send((_ranking(repo, created, payload), len(created)))
+        elif operation == "credit_totals":
+            connection.send(repo.credit_totals())
+
+
+class ShardedRepository:
+    def __init__(self, shards=None):
+        self._connections = []
+        self._processes = []
+        for _ in range(shards or multiprocessing.cpu_count()):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(worker_connection,), daemon=True)
+            process.start()
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._created = itertools.count()
+
+    def handle(self, cmd: commands.Command):
+        result, error = self.handle_many([cmd])[0]
+        if error is not None:
+            raise error
+        return result
+
+    def handle_many(self, cmds: list[commands.Command]):
+        """Run cmds on their shards in parallel; return a (result, error) pair for each.
+
+        Commands for the same shard keep their relative order, and a
+        ranking sees every command before it.
+        """
+        results = [None] * len(cmds)
+        routed = {}
+        for position, cmd in enumerate(cmds):
+            if isinstance(cmd, commands.ListTopStudents):
+                try:
+                    check_page(cmd)
+                except InvalidPage as e:
+                    results[position] = (None, e)
+                    continue
+                self._dispatch(routed, results)
+                routed = {}
+                end = cmd.cursor + cmd.limit
+                students, total = self.list_students(end, with_total=True)
+                results[position] = ((students[cmd.cursor:], end if end < total else None), None)
+                continue
+            if isinstance(cmd, commands.ListCourseStudents):
+                # Students in the course may live on any shard.
+                self._dispatch(routed, results)
+                routed = {}
+                outcomes = self._broadcast(cmd)
+                results[position] = ([s for students, _ in outcomes for s in students], None)
+                continue
+            if isinstance(cmd, commands.SetCourseMarks):
+                self._dispatch(routed, results)
+                routed = {}
+                results[position] = self._set_course_marks(cmd)
+                continue
+            if isinstance(cmd, commands.GPADistribution):
+                self._dispatch(routed, results)
+                routed = {}
+                results[position] = (self.gpa_distribution(cmd.bins), None)
+                continue
+            shard = shard_of(commands.student_id(cmd), len(self._connections))
+            order = next(self._created) if isinstance(cmd, commands.CreateStudent) else None
+            routed.setdefault(shard, []).append((position, (cmd, order)))
+        self._dispatch(routed, results)
+        return results
+
+    def _dispatch(self, routed, results):
+        for shard, items in routed.items():
+            self._connections[shard].send(("handle", [item for _, item in items]))
+        for shard, items in routed.items():
+            for (position, _), outcome in zip(items, self._connections[shard].recv()):
+                results[position] = outcome
+
+    def _set_course_marks(self, cmd):
+        # Each shard sets the marks of its own students, once every shard
+        # has checked its part of the roster, so an invalid student or
+        # mark on one shard leaves the marks on all of them unchanged.
+        parts = {}
+        for student_id, mark in cmd.marks.items():
+            shard = shard_of(student_id, len(self._connections))
+            parts.setdefault(shard, commands.SetCourseMarks(cmd.id, {})).marks[student_id] = mark
+        for shard, part in parts.items():
+            self._connections[shard].send(("check", part))
+        errors = [self._connections[shard].recv() for shard in parts]
+        error = next((error for error in errors if error is not None), None)
+        if error is not None:
+            return None, error
+        for shard, part in parts.items():
+            self._connections[shard].send(("handle", [(part, None)]))
+        errors = [self._connections[shard].recv()[0][1] for shard in parts]
+        return None, next((error for error in errors if error is not None), None)
+
+    def _broadcast(self, cmd):
+        for connection in self._connections:
+            connection.send(("handle", [(cmd, None)]))
+        return [connection.recv()[0] for connection in self._connections]
+
+    def list_students(self, limit=None, with_total=False):
+        """Students by GPA, best first, as list_students orders them; at most limit of them."""
+        for connection in self._connections:
+            connection.send(("ranking", limit))
+        rankings, total = [], 0
+        for connection in self._connections:
+            ranking, count = connection.recv()
+            rankings.append(ranking)
+            total += count
+        merged = heapq.merge(*rankings, key=lambda item: item[:2])
+        students = [student for _, _, student in itertools.islice(merged, limit)]
+        return (students, total) if with_total else students
+
+    def gpa_distribution(self, bins=10):
+        """summarize_gpas() over the students of every shard."""
+        import numpy as np
+
+        for connection in self._connections:
+            connection.send(("credit_totals", None))
+        totals = [connection.recv() for connection in self._connections]
+        return summarize_gpas(
+            np.concatenate([total_credits for total_credits, _ in totals]),
+            np.concatenate([weighted_sums for _, weighted_sums in totals]),
+            bins,
+        )
+
+    def close(self):
+        for connection in self._connections:
+            connection.send(None)
+        for process in self._processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
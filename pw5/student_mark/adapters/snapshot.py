@@ -0,0 +1,351 @@
+"""Versioned binary snapshot of a repository that can be opened with mmap.
+
+Layout (little-endian):
+
+    header       MAGIC, VERSION, the command log lsn the snapshot includes,
+                 counts and the offset of every section
+    students     one student record per student, in list() order
+    id index     uint32 student rows sorted by id, for binary search
+    enrollments  one enrollment record per course, grouped by student
+    strings      utf-8 string table referenced by (offset, length) pairs
+
+The record layouts are the NumPy dtypes record_dtypes() returns. NumPy
+is only imported once a snapshot is written or its records are first
+read, so opening one costs no more than reading its header.
+"""
+import functools
+import mmap
+import os
+import struct
+from student_mark.adapters import repositories
+from student_mark.adapters.repositories import DuplicateStudentId
+from student_mark.domains import models
+
+MAGIC = b"SMSNAP\x00\x00"
+VERSION = 2
+HEADER = struct.Struct("<8sIQQQQQQQ")
+# The same records as record_dtypes(), for reading one at a time.
+# A string reference is an (offset, length) pair.
+STUDENT_RECORD = struct.Struct("<QIQIQIQI")
+ENROLLMENT_RECORD = struct.Struct("<QIQIqd")
+ID_INDEX_ENTRY = struct.Struct("<I")
+
+
+@functools.cache
+def record_dtypes():
+    """The (student, enrollment) record dtypes."""
+    import numpy as np
+
+    string_ref = np.dtype([("offset", "<u8"), ("length", "<u4")])
+    student = np.dtype(
+        [
+            ("id", string_ref),
+            ("name", string_ref),
+            ("date_of_birth", string_ref),
+            ("first_enrollment", "<u8"),
+            ("enrollment_count", "<u4"),
+        ]
+    )
+    enrollment = np.dtype(
+        [
+            ("id", string_ref),
+            ("name", string_ref),
+            ("credit", "<i8"),
+            ("mark", "<f8"),
+        ]
+    )
+    return student, enrollment
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _StringTable:
+    def __init__(self):
+        self._offsets = {}
+        self._chunks = []
+        self._size = 0
+
+    def add(self, value):
+        data = str(value).encode()
+        if data not in self._offsets:
+            self._offsets[data] = self._size
+            self._chunks.append(data)
+            self._size += len(data)
+        return self._offsets[data], len(data)
+
+    def tobytes(self):
+        return b"".join(self._chunks)
+
+
+def write_snapshot(repo: repositories.AbstractRepository, path, lsn=0):
+    import numpy as np
+
+    student_dtype, enrollment_dtype = record_dtypes()
+    strings = _StringTable()
+    students = list(repo.list())
+    student_records = np.zeros(len(students), dtype=student_dtype)
+    enrollment_records = np.zeros(
+        sum(len(student.courses) for student in students), dtype=enrollment_dtype
+    )
+
+    position = 0
+    for row, student in enumerate(students):
+        student_records[row] = (
+            strings.add(student.id),
+            strings.add(student.name),
+            strings.add(student.date_of_birth),
+            position,
+            len(student.courses),
+        )
+        for course in student.courses:
+            enrollment_records[position] = (
+                strings.add(course.id),
+                strings.add(course.name),
+                course.credit,
+                course.mark,
+            )
+            position += 1
+
+    id_index = np.array(
+        sorted(range(len(students)), key=lambda row: students[row].id.encode()),
+        dtype="<u4",
+    )
+
+    students_offset = HEADER.size
+    index_offset = students_offset + student_records.nbytes
+    enrollments_offset = index_offset + id_index.nbytes
+    strings_offset = enrollments_offset + enrollment_records.nbytes
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        lsn,
+        len(student_records),
+        len(enrollment_records),
+        students_offset,
+        index_offset,
+        enrollments_offset,
+        strings_offset,
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(header)
+        file.write(student_records.tobytes())
+        file.write(id_index.tobytes())
+        file.write(enrollment_records.tobytes())
+        file.write(strings.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class SnapshotRepository(repositories.AbstractRepository):
+    """Repository backed by a mmapped snapshot.
+
+    Opening only reads the header. A student is decoded the first time it
+    is requested, and the catalog of every course when it is first needed;
+    students added afterwards live in memory until the next write_snapshot().
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < HEADER.size:
+            raise SnapshotError(f"Truncated snapshot {path}")
+        (
+            magic,
+            version,
+            self.lsn,
+            self._student_count,
+            self._enrollment_count,
+            self._students_offset,
+            self._index_offset,
+            self._enrollments_offset,
+            self._strings_offset,
+        ) = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not a student snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {version}")
+        self._loaded = {}
+        self._students = {}
+        self.modified = False
+
+    # Whole-file views for the vectorized credit_totals() and catalog;
+    # get() and list() read records one at a time with struct.
+    @functools.cached_property
+    def _records(self):
+        import numpy as np
+
+        return np.frombuffer(
+            self._mm, record_dtypes()[0], self._student_count, self._students_offset
+        )
+
+    @functools.cached_property
+    def _enrollments(self):
+        import numpy as np
+
+        return np.frombuffer(
+            self._mm, record_dtypes()[1], self._enrollment_count, self._enrollments_offset
+        )
+
+    @functools.cached_property
+    def catalog(self):
+        # Every course in the snapshot is catalogued on first use, in the
+        # order its students were written, so a new enrollment is checked
+        # against the courses of students not loaded yet.
+        import numpy as np
+
+        catalog = models.Catalog()
+        if self._enrollment_count:
+            enrollments = self._enrollments
+            # Strings are stored once, so equal strings share an offset.
+            keys = np.stack(
+                [
+                    enrollments["id"]["offset"].astype(np.int64),
+                    enrollments["name"]["offset"].astype(np.int64),
+                    enrollments["credit"].astype(np.int64),
+                ],
+                axis=1,
+            )
+            _, firsts = np.unique(keys, axis=0, return_index=True)
+            for position in np.sort(firsts).tolist():
+                id, name, credit, _ = self._enrollment(position)
+                catalog.entry(id, name, credit)
+        return catalog
+
+    def add(self, student):
+        if self.get(student.id) is not None:
+            raise DuplicateStudentId(f"Duplicate student ID {student.id}")
+        self._students[student.id] = student
+        self.modified = True
+
+    def get(self, id):
+        if id in self._students:
+            return self._students[id]
+        row = self._find(id)
+        if row is None:
+            return None
+        return self._load(row)
+
+    def list(self):
+        return [self._load(row) for row in range(self._student_count)] + list(
+            self._students.values()
+        )
+
+    def remove(self, id):
+        # Only students added since the snapshot was written can be removed.
+        del self._students[id]
+        self.modified = True
+
+    def add_course(self, student, course):
+        super().add_course(student, course)
+        self.modified = True
+
+    def remove_course(self, student, course):
+        super().remove_course(student, course)
+        self.modified = True
+
+    def update_course_mark(self, student, course, mark):
+        super().update_course_mark(student, course, mark)
+        self.modified = True
+
+    def gpas(self):
+        return repositories.gpas_from_totals(*self.credit_totals())
+
+    def credit_totals(self):
+        import numpy as np
+
+        counts = self._records["enrollment_count"].astype(np.int64)
+        owners = np.repeat(np.arange(len(self._records)), counts)
+        credits = self._enrollments["credit"].astype(np.float64)
+        total_credits = np.bincount(owners, weights=credits, minlength=len(counts))
+        weighted_sums = np.bincount(
+            owners, weights=credits * self._enrollments["mark"], minlength=len(counts)
+        )
+        # Loaded students may have changed since the snapshot was written.
+        for row, student in self._loaded.items():
+            total_credits[row] = student.total_credit
+            weighted_sums[row] = student.weighted_sum
+        added = self._students.values()
+        return (
+            np.concatenate([total_credits, [student.total_credit for student in added]]),
+            np.concatenate([weighted_sums, [student.weighted_sum for student in added]]),
+        )
+
+    def close(self):
+        self._records = self._enrollments = None
+        self._mm.close()
+        self._file.close()
+
+    def _string(self, offset, length):
+        start = self._strings_offset + offset
+        return self._mm[start : start + length].decode()
+
+    def _id(self, position):
+        # Raw id of the student at position in the id index, and its row.
+        (row,) = ID_INDEX_ENTRY.unpack_from(
+            self._mm, self._index_offset + position * ID_INDEX_ENTRY.size
+        )
+        offset, length = struct.unpack_from(
+            "<QI", self._mm, self._students_offset + row * STUDENT_RECORD.size
+        )
+        start = self._strings_offset + offset
+        return self._mm[start : start + length], row
+
+    def _find(self, id):
+        key = str(id).encode()
+        low, high = 0, self._student_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._id(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._student_count:
+            candidate, row = self._id(low)
+            if candidate == key:
+                return row
+        return None
+
+    def _enrollment(self, position):
+        # (course id, name, credit, mark) of the enrollment record at position.
+        (
+            id_offset,
+            id_length,
+            name_offset,
+            name_length,
+            credit,
+            mark,
+        ) = ENROLLMENT_RECORD.unpack_from(
+            self._mm, self._enrollments_offset + position * ENROLLMENT_RECORD.size
+        )
+        return self._string(id_offset, id_length), self._string(name_offset, name_length), credit, mark
+
+    def _load(self, row):
+        if row not in self._loaded:
+            (
+                id_offset,
+                id_length,
+                name_offset,
+                name_length,
+                date_offset,
+                date_length,
+                first,
+                count,
+            ) = STUDENT_RECORD.unpack_from(
+                self._mm, self._students_offset + row * STUDENT_RECORD.size
+            )
+            courses = []
+            for position in range(first, first + count):
+                id, name, credit, mark = self._enrollment(position)
+                courses.append(models.Course(self.catalog.entry(id, name, credit), mark))
+            self._loaded[row] = models.Student(
+                self._string(id_offset, id_length),
+                self._string(name_offset, name_length),
+                self._string(date_offset, date_length),
+                courses=courses,
+            )
+        return self._loaded[row]
@@ -0,0 +1,261 @@
+"""Repository stored in an SQLite database.
+
+Students, courses and enrollments are normalized into their own tables,
+indexed on the ids they are looked up by. GPAs, and the ranking built on
+them, are aggregated in SQL. The database runs in WAL mode, so other
+connections can read while this one writes.
+"""
+import contextlib
+import sqlite3
+from student_mark.adapters import repositories
+from student_mark.adapters.repositories import DuplicateStudentId
+from student_mark.domains import models
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    date_of_birth TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS courses (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    credit INTEGER NOT NULL,
+    UNIQUE (id, name, credit)
+);
+CREATE TABLE IF NOT EXISTS enrollments (
+    row INTEGER PRIMARY KEY,
+    student INTEGER NOT NULL REFERENCES students (row),
+    course INTEGER NOT NULL REFERENCES courses (row),
+    mark REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS enrollments_student ON enrollments (student);
+CREATE INDEX IF NOT EXISTS enrollments_course ON enrollments (course);
+"""
+
+# Credit total and weighted mark sum of every student, in insertion order.
+TOTALS = """
+SELECT s.row, COALESCE(SUM(c.credit), 0), COALESCE(SUM(c.credit * e.mark), 0)
+FROM students s
+LEFT JOIN enrollments e ON e.student = s.row
+LEFT JOIN courses c ON c.row = e.course
+"""
+
+RANKED = """
+SELECT t.id FROM (
+    SELECT s.row, s.id,
+        py_round(COALESCE(SUM(c.credit * e.mark) * 1.0 / NULLIF(SUM(c.credit), 0), 0), 1) AS gpa
+    FROM students s
+    LEFT JOIN enrollments e ON e.student = s.row
+    LEFT JOIN courses c ON c.row = e.course
+    GROUP BY s.row
+) t
+ORDER BY t.gpa DESC, t.row
+LIMIT ? OFFSET ?
+"""
+
+
+class SqliteRepository(repositories.AbstractRepository):
+    """Loaded students are kept in an identity map so the handlers can
+    change them in place; each change is written through at once, in its
+    own transaction or in the one begin() opened."""
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+        # SQLite's ROUND takes halves away from zero; Student.gpa() uses
+        # Python's round, and the ranking has to agree with it.
+        self._db.create_function("py_round", 2, round, deterministic=True)
+        self._load_catalog()
+
+    def _load_catalog(self):
+        self._students = {}
+        self._enrollments = {}
+        self.catalog = models.Catalog()
+        self._course_rows = {}
+        for row, id, name, credit in self._db.execute(
+            "SELECT row, id, name, credit FROM courses ORDER BY row"
+        ):
+            self._course_rows[self.catalog.entry(id, name, credit)] = row
+
+    def begin(self):
+        self._db.execute("BEGIN")
+
+    def commit(self):
+        if self._db.in_transaction:
+            self._db.execute("COMMIT")
+
+    def rollback(self):
+        if self._db.in_transaction:
+            self._db.execute("ROLLBACK")
+            # Loaded students and row ids may no longer match the database.
+            self._load_catalog()
+
+    def add(self, student):
+        try:
+            with self._transaction():
+                cursor = self._db.execute(
+                    "INSERT INTO students (id, name, date_of_birth) VALUES (?, ?, ?)",
+                    (student.id, student.name, str(student.date_of_birth)),
+                )
+                for course in student.courses:
+                    self._insert_enrollment(cursor.lastrowid, course)
+        except sqlite3.IntegrityError:
+            raise DuplicateStudentId(f"Duplicate student ID {student.id}")
+        self._students[student.id] = student
+
+    def get(self, id):
+        if id not in self._students:
+            row = self._db.execute(
+                "SELECT row, id, name, date_of_birth FROM students WHERE id = ?", (id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._load(row)
+        return self._students[id]
+
+    def list(self):
+        rows = self._db.execute(
+            "SELECT row, id, name, date_of_birth FROM students ORDER BY row"
+        ).fetchall()
+        return [self._students.get(row[1]) or self._load(row) for row in rows]
+
+    def remove(self, id):
+        student = self.get(id)
+        with self._transaction():
+            row = self._student_row(id)
+            self._db.execute("DELETE FROM enrollments WHERE student = ?", (row,))
+            self._db.execute("DELETE FROM students WHERE row = ?", (row,))
+        for course in student.courses:
+            del self._enrollments[course]
+        del self._students[id]
+
+    def add_course(self, student, course):
+        super().add_course(student, course)
+        with self._transaction():
+            self._insert_enrollment(self._student_row(student.id), course)
+
+    def remove_course(self, student, course):
+        super().remove_course(student, course)
+        with self._transaction():
+            self._db.execute(
+                "DELETE FROM enrollments WHERE row = ?", (self._enrollments.pop(course),)
+            )
+
+    def update_course_mark(self, student, course, mark):
+        super().update_course_mark(student, course, mark)
+        with self._transaction():
+            self._db.execute(
+                "UPDATE enrollments SET mark = ? WHERE row = ?",
+                (mark, self._enrollments[course]),
+            )
+
+    def update_course_marks(self, students, courses, marks):
+        for student, course, mark in zip(students, courses, marks):
+            student.update_course_mark(course, mark)
+        with self._transaction():
+            self._db.executemany(
+                "UPDATE enrollments SET mark = ? WHERE row = ?",
+                zip(marks, (self._enrollments[course] for course in courses)),
+            )
+
+    def gpas(self):
+        return repositories.gpas_from_totals(*self.credit_totals())
+
+    def credit_totals(self):
+        import numpy as np
+
+        totals = np.array(
+            self._db.execute(f"{TOTALS} GROUP BY s.row ORDER BY s.row").fetchall(),
+            dtype=np.float64,
+        ).reshape(-1, 3)
+        return totals[:, 1], totals[:, 2]
+
+    def gpa(self, student_id):
+        row = self._db.execute(
+            f"{TOTALS} WHERE s.id = ? GROUP BY s.row", (student_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        _, total_credit, weighted_sum = row
+        if total_credit == 0:
+            return 0.0
+        return round(weighted_sum / total_credit, 1)
+
+    def course_students(self, course_id):
+        ids = self._db.execute(
+            """
+            SELECT DISTINCT s.id FROM courses c
+            JOIN enrollments e ON e.course = c.row
+            JOIN students s ON s.row = e.student
+            WHERE c.id = ? ORDER BY s.row
+            """,
+            (course_id,),
+        ).fetchall()
+        return [self.get(id) for (id,) in ids]
+
+    def ranked(self, limit=None, offset=0):
+        ids = self._db.execute(RANKED, (-1 if limit is None else limit, offset)).fetchall()
+        return [self.get(id) for (id,) in ids]
+
+    def close(self):
+        self._db.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        if self._db.in_transaction:
+            # Committed or rolled back with the transaction begin() opened.
+            yield
+            return
+        self._db.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _student_row(self, id):
+        return self._db.execute("SELECT row FROM students WHERE id = ?", (id,)).fetchone()[0]
+
+    def _insert_enrollment(self, student_row, course):
+        course_row = self._course_rows.get(course.entry)
+        if course_row is None:
+            self._db.execute(
+                "INSERT OR IGNORE INTO courses (id, name, credit) VALUES (?, ?, ?)",
+                (course.id, course.name, course.credit),
+            )
+            course_row = self._db.execute(
+                "SELECT row FROM courses WHERE id = ? AND name = ? AND credit = ?",
+                (course.id, course.name, course.credit),
+            ).fetchone()[0]
+            if course.entry is self.catalog.get(course.id):
+                self._course_rows[course.entry] = course_row
+        cursor = self._db.execute(
+            "INSERT INTO enrollments (student, course, mark) VALUES (?, ?, ?)",
+            (student_row, course_row, course.mark),
+        )
+        self._enrollments[course] = cursor.lastrowid
+
+    def _load(self, row):
+        student_row, id, name, date_of_birth = row
+        courses = []
+        for enrollment_row, course_id, course_name, credit, mark in self._db.execute(
+            """
+            SELECT e.row, c.id, c.name, c.credit, e.mark
+            FROM enrollments e JOIN courses c ON c.row = e.course
+            WHERE e.student = ? ORDER BY e.row
+            """,
+            (student_row,),
+        ):
+            course = models.Course(self.catalog.entry(course_id, course_name, credit), mark)
+            self._enrollments[course] = enrollment_row
+            courses.append(course)
+        student = models.Student(id, name, date_of_birth, courses=courses)
+        self._students[id] = student
+        return student
@@ -0,0 +1,93 @@
+"""Synthetic datasets in the students.txt/courses.txt/marks.txt format.
+
+    python -m student_mark.benchmarks.generate DATA_DIR --students N --courses M --marks K
+
+Every student enrolls in M distinct courses out of a catalog of 4 * M,
+and K mark updates are spread over random enrollments. Course c is
+always named Course<c> with credit c % 4 + 1, so the files load without
+conflicting course definitions. The same seed gives the same files.
+"""
+import argparse
+import os
+import random
+from student_mark.utils import io
+
+
+def course_id(c):
+    return f"C{c}"
+
+
+def course_name(c):
+    return f"Course{c}"
+
+
+def course_credit(c):
+    return c % 4 + 1
+
+
+def student_id(i):
+    return f"S{i}"
+
+
+def _students(students, rng):
+    for i in range(students):
+        date_of_birth = f"{rng.randint(1995, 2006)}-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}"
+        yield {"id": student_id(i), "name": f"Student{i}", "date_of_birth": date_of_birth}
+
+
+def _enrollments(students, courses, seed):
+    # Re-seeded so courses.txt and marks.txt draw the same enrollments.
+    rng = random.Random(seed)
+    catalog = range(4 * courses)
+    for i in range(students):
+        yield i, rng.sample(catalog, courses)
+
+
+def _courses(students, courses, seed):
+    for i, enrolled in _enrollments(students, courses, seed):
+        for c in enrolled:
+            yield {
+                "student_id": student_id(i),
+                "id": course_id(c),
+                "name": course_name(c),
+                "credit": course_credit(c),
+            }
+
+
+def _marks(students, courses, marks, seed, rng):
+    if students == 0 or courses == 0:
+        return
+    enrollments = dict(_enrollments(students, courses, seed))
+    for _ in range(marks):
+        i = rng.randrange(students)
+        yield {
+            "student_id": student_id(i),
+            "id": course_id(rng.choice(enrollments[i])),
+            "mark": round(rng.uniform(0, 20), 1),
+        }
+
+
+def generate(data_dir, students, courses, marks, seed=0):
+    """Write the three data files, and their offset indexes, into data_dir."""
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(seed)
+    io.rewrite_file(_students(students, rng), os.path.join(data_dir, "students.txt"))
+    io.rewrite_file(_courses(students, courses, seed), os.path.join(data_dir, "courses.txt"))
+    io.rewrite_file(
+        _marks(students, courses, marks, seed, rng), os.path.join(data_dir, "marks.txt")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_dir")
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--marks", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.data_dir, args.students, args.courses, args.marks, args.seed)
+
+
+if __name__ == "__main__":
+    main()
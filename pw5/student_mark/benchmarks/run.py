@@ -0,0 +1,281 @@
+"""Time the main code paths against a generated dataset and report JSON.
+
+    python -m student_mark.benchmarks.run --students 10000 --courses 20 --marks 100000 \
+        --output after.json --compare before.json
+
+The dataset is generated into a temporary directory laid out like the
+repository root, so load_data() and the other code paths read the same
+relative paths they do in production. Every result keeps its individual
+runs plus their min and median, and per-operation figures for the
+command handlers. With --compare, each median is printed next to the
+one in an earlier result file.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from student_mark.benchmarks import generate
+from student_mark.adapters import repositories
+from student_mark.domains import commands
+from student_mark.entrypoints.main import DATA_FILES, handle, load_data
+from student_mark.service_layer import handlers
+from student_mark.utils import io
+import numpy as np
+
+# Repository-wide commands cost far more than the per-student ones, so
+# they run this many times fewer per round.
+WIDE_COMMAND_DIVISOR = 100
+
+
+def _create_student(repo, rng, run, n):
+    return [commands.CreateStudent(f"B{run}-{k}", f"Bench{k}", "2000-01-01") for k in range(n)]
+
+
+def _enrolled(repo, rng, n):
+    return [student for student in rng.sample(list(repo.list()), n) if student.courses]
+
+
+def _add_course(repo, rng, run, n):
+    # Enrolls the students _create_student made in the same round in
+    # courses that already exist.
+    cmds = []
+    for k, student in enumerate(_enrolled(repo, rng, n)):
+        course = rng.choice(student.courses)
+        cmds.append(commands.AddCourse(course.id, f"B{run}-{k}", course.name, course.credit))
+    return cmds
+
+
+def _update_course_mark(repo, rng, run, n):
+    return [
+        commands.UpdateCourseMark(rng.choice(student.courses).id, student.id, rng.uniform(0, 20))
+        for student in _enrolled(repo, rng, n)
+    ]
+
+
+def _student_ids(repo, rng, n):
+    return [student.id for student in rng.sample(list(repo.list()), n)]
+
+
+def _list_student_courses(repo, rng, run, n):
+    return [commands.ListStudentCourses(id) for id in _student_ids(repo, rng, n)]
+
+
+def _calculate_gpa(repo, rng, run, n):
+    return [commands.CalculateGPA(id) for id in _student_ids(repo, rng, n)]
+
+
+def _set_course_marks(repo, rng, run, n):
+    # A whole course's roster per command.
+    return [
+        commands.SetCourseMarks(
+            course.id, {s.id: rng.uniform(0, 20) for s in repo.course_students(course.id)}
+        )
+        for course in (
+            rng.choice(student.courses)
+            for student in _enrolled(repo, rng, max(1, n // WIDE_COMMAND_DIVISOR))
+        )
+    ]
+
+
+def _list_top_students(repo, rng, run, n):
+    return [
+        commands.ListTopStudents(10, rng.randrange(100))
+        for _ in range(max(1, n // WIDE_COMMAND_DIVISOR))
+    ]
+
+
+def _list_course_students(repo, rng, run, n):
+    return [
+        commands.ListCourseStudents(rng.choice(student.courses).id)
+        for student in _enrolled(repo, rng, max(1, n // WIDE_COMMAND_DIVISOR))
+    ]
+
+
+def _gpa_distribution(repo, rng, run, n):
+    return [commands.GPADistribution() for _ in range(max(1, n // WIDE_COMMAND_DIVISOR))]
+
+
+# How to build a round of n commands of each type, in the order they run.
+COMMAND_FACTORIES = {
+    commands.CreateStudent: _create_student,
+    commands.AddCourse: _add_course,
+    commands.UpdateCourseMark: _update_course_mark,
+    commands.SetCourseMarks: _set_course_marks,
+    commands.ListStudentCourses: _list_student_courses,
+    commands.CalculateGPA: _calculate_gpa,
+    commands.ListTopStudents: _list_top_students,
+    commands.ListCourseStudents: _list_course_students,
+    commands.GPADistribution: _gpa_distribution,
+}
+
+
+def summarize(runs, ops=1):
+    ordered = sorted(runs)
+    median = ordered[len(ordered) // 2]
+    return {
+        "runs": runs,
+        "min": ordered[0],
+        "median": median,
+        "ops": ops,
+        "per_op_us": median / ops * 1e6 if ops else None,
+    }
+
+
+def timed(function, *args):
+    # Start every measurement from a collected heap, so one does not pay
+    # for the garbage the one before it left.
+    gc.collect()
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def dataset(students, courses, marks, seed):
+    """Generate a dataset in a temporary root and work from there."""
+    cwd = os.getcwd()
+    root = tempfile.mkdtemp(prefix="student_mark_bench_")
+    try:
+        data_dir = os.path.dirname(DATA_FILES[commands.CreateStudent][0])
+        generate.generate(os.path.join(root, data_dir), students, courses, marks, seed)
+        os.chdir(root)
+        yield data_dir
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
+
+
+def bench_load_data(repeat):
+    runs = []
+    for _ in range(repeat):
+        repo = repositories.LocalRepository([])
+        runs.append(timed(load_data, repo))
+    return summarize(runs), repo
+
+
+def bench_handle(repo, repeat, ops, seed):
+    results = {}
+    rng = random.Random(seed)
+    runs = {command_type: [] for command_type in COMMAND_FACTORIES}
+    counts = {}
+    for run in range(repeat):
+        for command_type, factory in COMMAND_FACTORIES.items():
+            cmds = factory(repo, rng, run, ops)
+            counts[command_type] = len(cmds)
+
+            def handle_all():
+                for cmd in cmds:
+                    handle(cmd, repo)
+
+            runs[command_type].append(timed(handle_all))
+    for command_type, timings in runs.items():
+        results[f"handle.{command_type.__name__}"] = summarize(timings, counts[command_type])
+    return results
+
+
+def bench_archive(data_dir, repeat):
+    files = list(dict.fromkeys(filename for filename, _ in DATA_FILES.values()))
+    files += [io.index_path(filename) for filename in files]
+    archive = os.path.join(data_dir, "bench.dat")
+    results = {}
+
+    runs = []
+    for _ in range(repeat):
+        if os.path.exists(archive):
+            os.remove(archive)
+        runs.append(timed(io.compress_files, files, archive))
+    results["compress_files"] = summarize(runs)
+    # Nothing changed since the last run, so every member is copied as is.
+    results["compress_files.unchanged"] = summarize(
+        [timed(io.compress_files, files, archive) for _ in range(repeat)]
+    )
+
+    runs = []
+    for run in range(repeat):
+        extract_dir = os.path.join(data_dir, f"extract-{run}")
+        runs.append(timed(io.decompress_files, archive, extract_dir))
+        shutil.rmtree(extract_dir)
+    results["decompress_files"] = summarize(runs)
+    with zipfile.ZipFile(archive) as zipf:
+        size = sum(info.file_size for info in zipf.infolist())
+    return results, size
+
+
+def run(students, courses, marks, repeat=3, ops=10000, seed=0):
+    with dataset(students, courses, marks, seed) as data_dir:
+        results = {}
+        results["load_data"], repo = bench_load_data(repeat)
+        results["list_students"] = summarize(
+            [timed(handlers.list_students, repo) for _ in range(repeat)]
+        )
+        results.update(bench_handle(repo, repeat, min(ops, students), seed))
+        archive_results, data_size = bench_archive(data_dir, repeat)
+        results.update(archive_results)
+
+    return {
+        "dataset": {
+            "students": students,
+            "courses": courses,
+            "marks": marks,
+            "seed": seed,
+            "data_bytes": data_size,
+        },
+        "repeat": repeat,
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare(old, new, file=sys.stderr):
+    print(f"{'benchmark':<36}{'before':>12}{'after':>12}{'ratio':>8}", file=file)
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            print(f"{name:<36}{'-':>12}{result['median']:>12.6f}{'-':>8}", file=file)
+        else:
+            ratio = result["median"] / before["median"] if before["median"] else float("inf")
+            print(
+                f"{name:<36}{before['median']:>12.6f}{result['median']:>12.6f}{ratio:>8.2f}",
+                file=file,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--marks", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ops", type=int, default=10000, help="commands per handle() round")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON output to print medians against")
+    args = parser.parse_args()
+
+    report = run(args.students, args.courses, args.marks, args.repeat, args.ops, args.seed)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Check that the CLI entry point imports within a time budget.
+
+    python -m student_mark.benchmarks.startup --budget-ms 75
+
+Imports student_mark.entrypoints.main in fresh interpreters under
+-X importtime, reports the median cumulative import time and the slowest
+modules, and exits non-zero if the median is over budget or a module in
+LAZY was imported. Those are only needed by some commands, which import
+them on first use.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ENTRY_POINT = "student_mark.entrypoints.main"
+# Interpreter startup, about 15 ms, comes on top of this, keeping a CLI
+# invocation under 100 ms.
+BUDGET_MS = 75
+LAZY = ("numpy", "zipfile", "concurrent.futures", "sqlite3", "asyncio", "student_mark.utils.loader")
+
+
+def import_times(module):
+    """{module: (self us, cumulative us)} for one import of module in a fresh interpreter."""
+    check = f"import sys, {module}; print(*(m for m in {LAZY!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times, result.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to print")
+    args = parser.parse_args()
+
+    runs = [import_times(ENTRY_POINT) for _ in range(args.repeat)]
+    totals = sorted(times[ENTRY_POINT][1] for times, _ in runs)
+    median_ms = totals[len(totals) // 2] / 1000
+    times, imported = runs[-1]
+
+    print(f"{ENTRY_POINT}: {median_ms:.1f} ms (budget {args.budget_ms:g} ms)")
+    for name, (self_us, cumulative_us) in sorted(
+        times.items(), key=lambda item: item[1][0], reverse=True
+    )[: args.top]:
+        print(f"  {self_us / 1000:7.1f} ms self {cumulative_us / 1000:7.1f} ms total  {name}")
+
+    failed = False
+    if imported:
+        print(f"Imported at startup, should be lazy: {', '.join(imported)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print("Over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
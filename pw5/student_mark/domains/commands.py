@@ -33,6 +33,37 @@ class UpdateCourseMark(Command):
     mark: float
 
 
+@dataclasses.dataclass
+class SetCourseMarks(Command):
+    id: str
+    marks: dict[str, float]
+
+
 @dataclasses.dataclass
 class CalculateGPA(Command):
     id: str
+
+
+@dataclasses.dataclass
+class ListCourseStudents(Command):
+    id: str
+
+
+@dataclasses.dataclass
+class ListTopStudents(Command):
+    limit: int
+    cursor: int = 0
+
+
+@dataclasses.dataclass
+class GPADistribution(Command):
+    bins: int = 10
+
+
+def student_id(cmd: Command):
+    """Id of the student cmd reads or changes, or None for repository-wide commands."""
+    if hasattr(cmd, "student_id"):
+        return cmd.student_id
+    if isinstance(cmd, (CreateStudent, ListStudentCourses, CalculateGPA)):
+        return cmd.id
+    return None
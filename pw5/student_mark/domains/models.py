@@ -1,31 +1,107 @@
 from __future__ import annotations
+import sys
 from datetime import date
 from typing import List
 
 
+def _shared(value):
+    # Birth dates repeat across students; interning keeps one copy of each
+    # string instead of one per student.
+    return sys.intern(value) if type(value) is str else value
+
+
 class Student:
+    __slots__ = ("id", "name", "date_of_birth", "courses", "total_credit", "weighted_sum")
+
     def __init__(self, id: str, name: str, date_of_birth: date, courses: List[Course]):
         self.id = id
         self.name = name
-        self.date_of_birth = date_of_birth
+        self.date_of_birth = _shared(date_of_birth)
         self.courses = courses
+        self.total_credit = 0
+        self.weighted_sum = 0
+        for course in courses:
+            credit = course.entry.credit
+            self.total_credit = self.total_credit + credit
+            self.weighted_sum = self.weighted_sum + credit * course.mark
 
-    def gpa(self) -> float:
-        total_credit = 0
-        weighted_sum = 0
-        for course in self.courses:
-            total_credit = total_credit + course.credit
-            weighted_sum = weighted_sum + course.credit * course.mark
+    def add_course(self, course: Course):
+        credit = course.entry.credit
+        self.courses.append(course)
+        self.total_credit = self.total_credit + credit
+        self.weighted_sum = self.weighted_sum + credit * course.mark
+
+    def remove_course(self, course: Course):
+        credit = course.entry.credit
+        self.courses.remove(course)
+        self.total_credit = self.total_credit - credit
+        self.weighted_sum = self.weighted_sum - credit * course.mark
+
+    def update_course_mark(self, course: Course, mark: float):
+        self.weighted_sum = self.weighted_sum + course.entry.credit * (mark - course.mark)
+        course.mark = mark
 
-        if total_credit == 0:
+    def gpa(self) -> float:
+        if self.total_credit == 0:
             return 0.0
 
-        return round(weighted_sum / total_credit, 1)
+        return round(self.weighted_sum / self.total_credit, 1)
 
 
-class Course:
-    def __init__(self, id: str, name: str, credit: int, mark: float = 0):
+class CatalogEntry:
+    __slots__ = ("id", "name", "credit")
+
+    def __init__(self, id: str, name: str, credit: int):
         self.id = id
         self.name = name
         self.credit = credit
+
+
+class Catalog:
+    """One CatalogEntry per course id, shared by every enrollment in the course."""
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, id) -> CatalogEntry:
+        return self._entries.get(id)
+
+    def entry(self, id: str, name: str, credit: int) -> CatalogEntry:
+        """The entry for course id, catalogued if the id is new.
+
+        A name or credit that differs from the catalogued ones gets an
+        entry of its own, left out of the catalog.
+        """
+        entry = self._entries.get(id)
+        if entry is None:
+            entry = self._entries[id] = CatalogEntry(id, name, credit)
+        elif entry.name != name or entry.credit != credit:
+            entry = CatalogEntry(id, name, credit)
+        return entry
+
+    def forget(self, entry: CatalogEntry):
+        """Drop entry from the catalog, if it is the one catalogued for its id."""
+        if self._entries.get(entry.id) is entry:
+            del self._entries[entry.id]
+
+
+class Course:
+    """A student's enrollment in a course: its catalog entry and the mark."""
+
+    __slots__ = ("entry", "mark")
+
+    def __init__(self, entry: CatalogEntry, mark: float = 0):
+        self.entry = entry
         self.mark = mark
+
+    @property
+    def id(self) -> str:
+        return self.entry.id
+
+    @property
+    def name(self) -> str:
+        return self.entry.name
+
+    @property
+    def credit(self) -> int:
+        return self.entry.credit
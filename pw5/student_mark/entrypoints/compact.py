@@ -0,0 +1,13 @@
+from student_mark.adapters import wal
+from student_mark.entrypoints.main import LOG_PATH, archive_lsn, checkpoint, open_repository
+
+
+def main():
+    repo = open_repository()
+    log = wal.CommandLog(LOG_PATH, lsn=archive_lsn())
+    checkpoint(repo, log, compact=True)
+    log.close()
+
+
+if __name__ == "__main__":
+    main()
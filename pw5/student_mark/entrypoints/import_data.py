@@ -0,0 +1,32 @@
+from student_mark.adapters import wal
+from student_mark.entrypoints.main import LOG_PATH, archive_lsn, checkpoint, open_repository
+from student_mark.utils import importer
+import sys
+
+
+def main(argv):
+    """Usage: import_data KIND PATH [KIND PATH ...], KIND being students, courses or marks."""
+    if len(argv) < 2 or len(argv) % 2 or any(kind not in importer.FIELDS for kind in argv[::2]):
+        print(main.__doc__)
+        return 1
+
+    repo = open_repository()
+    for kind, path in zip(argv[::2], argv[1::2]):
+        report = importer.import_file(
+            path,
+            kind,
+            repo,
+            progress=lambda report: print(f"{path}: {report.rows} rows", file=sys.stderr),
+        )
+        print(f"{path}: {report.applied} of {report.rows} rows imported, {report.error_count} errors")
+        for error in report.errors:
+            print(f"  line {error.line}: {error.message}")
+
+    log = wal.CommandLog(LOG_PATH, lsn=archive_lsn())
+    checkpoint(repo, log, compact=True)
+    log.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
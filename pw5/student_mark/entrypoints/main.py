@@ -2,15 +2,105 @@ from student_mark.utils import io
 from student_mark.utils.io import InvalidChoice
 from student_mark.domains import commands
 from student_mark.service_layer.handlers import list_students
-from student_mark.service_layer.handlers import COMMANDS_HANDLERS
-from student_mark.service_layer.handlers import InvalidCourseId, InvalidStudentId
+from student_mark.service_layer.handlers import COMMANDS_HANDLERS, BATCH_HANDLERS, REPLAY_HANDLERS
+from student_mark.service_layer.handlers import InvalidCourseId, InvalidMark, InvalidPage, InvalidStudentId
+from student_mark.service_layer import unit_of_work
+from student_mark.service_layer.metrics import METRICS
 from student_mark.adapters import repositories
+from student_mark.adapters.repositories import DuplicateStudentId
+from student_mark.adapters import snapshot
+from student_mark.adapters import wal
 import sys
 import os
+import time
 
-def end_program():
-    files_to_compress = ['pw5/student_mark/data/students.txt', 'pw5/student_mark/data/courses.txt', 'pw5/student_mark/data/marks.txt']
-    io.compress_files(files_to_compress, 'pw5/student_mark/data/student.dat')
+ARCHIVE_PATH = 'pw5/student_mark/data/student.dat'
+SNAPSHOT_PATH = 'pw5/student_mark/data/student.snap'
+LOG_PATH = 'pw5/student_mark/data/commands.log'
+# Below this many bytes of text data, starting a process pool costs more
+# than it saves. Only parsing runs in the pool, so it never pays off on a
+# single CPU.
+PARALLEL_LOAD_THRESHOLD = 16 << 20
+
+# Text file and column order each logged command is checkpointed into.
+DATA_FILES = {
+    commands.CreateStudent: ('pw5/student_mark/data/students.txt', ('id', 'name', 'date_of_birth')),
+    commands.AddCourse: ('pw5/student_mark/data/courses.txt', ('student_id', 'id', 'name', 'credit')),
+    commands.UpdateCourseMark: ('pw5/student_mark/data/marks.txt', ('student_id', 'id', 'mark')),
+}
+# Checkpointed as the UpdateCourseMark rows it stands for; see data_rows().
+DATA_FILES[commands.SetCourseMarks] = DATA_FILES[commands.UpdateCourseMark]
+
+# Order handle_batch applies command types in, so one batch can create a
+# student, enroll it and mark it. Other commands run after these.
+BATCH_ORDER = [commands.CreateStudent, commands.AddCourse, commands.UpdateCourseMark]
+
+def archive_lsn():
+    comment = io.read_archive_comment(ARCHIVE_PATH).decode()
+    if comment.startswith('lsn='):
+        return int(comment[len('lsn='):])
+    return 0
+
+def compacted_rows(repo: repositories.AbstractRepository):
+    """Text file rows that rebuild repo's current state with one line per fact."""
+    students, courses, marks = [], [], []
+    for student in repo.list():
+        students.append({'id': student.id, 'name': student.name, 'date_of_birth': student.date_of_birth})
+        for course in student.courses:
+            courses.append({'student_id': student.id, 'id': course.id, 'name': course.name, 'credit': course.credit})
+            if course.mark != 0:
+                marks.append({'student_id': student.id, 'id': course.id, 'mark': course.mark})
+    return {
+        DATA_FILES[commands.CreateStudent][0]: students,
+        DATA_FILES[commands.AddCourse][0]: courses,
+        DATA_FILES[commands.UpdateCourseMark][0]: marks,
+    }
+
+def data_rows(cmd: commands.Command):
+    """(text file, row) pairs that checkpoint a logged command."""
+    if isinstance(cmd, commands.SetCourseMarks):
+        for student_id, mark in cmd.marks.items():
+            yield from data_rows(commands.UpdateCourseMark(cmd.id, student_id, mark))
+        return
+    filename, fields = DATA_FILES[type(cmd)]
+    yield filename, {field: getattr(cmd, field) for field in fields}
+
+def checkpoint(repo: repositories.AbstractRepository, log: wal.CommandLog, compact=False):
+    """Fold the command log into student.dat and the snapshot, then empty it.
+
+    Both record the lsn they include, so records are never applied twice
+    if this is interrupted before the log is emptied. With compact, the
+    text files are rewritten from repo instead of appended to, dropping
+    superseded marks.
+    """
+    log.sync()
+    if compact:
+        for filename, data in compacted_rows(repo).items():
+            io.rewrite_file(data, filename)
+    else:
+        archived = archive_lsn()
+        io.decompress_files(ARCHIVE_PATH, 'pw5/student_mark/data')
+        rows = {}
+        for lsn, cmds in wal.read_log(LOG_PATH):
+            if lsn <= archived:
+                continue
+            for cmd in cmds:
+                if type(cmd) in DATA_FILES:
+                    for filename, row in data_rows(cmd):
+                        rows.setdefault(filename, []).append(row)
+        for filename, data in rows.items():
+            io.append_to_file(data, filename)
+
+    files_to_compress = list(dict.fromkeys(filename for filename, _ in DATA_FILES.values()))
+    files_to_compress += [io.index_path(file) for file in files_to_compress]
+    io.compress_files(files_to_compress, ARCHIVE_PATH, comment=f'lsn={log.lsn}'.encode())
+    if not isinstance(repo, snapshot.SnapshotRepository) or repo.modified:
+        snapshot.write_snapshot(repo, SNAPSHOT_PATH, lsn=log.lsn)
+    log.reset()
+
+def end_program(repo: repositories.AbstractRepository, log: wal.CommandLog, compact=False):
+    checkpoint(repo, log, compact=compact)
+    log.close()
     print("Ending program...")
     sys.exit()
 
@@ -20,12 +110,93 @@ def handle(
     command_handlers=COMMANDS_HANDLERS,
 ):
     handler = command_handlers[type(command)]
-    result = handler(command, repo)
+    if not METRICS.enabled:
+        return handler(command, repo)
+
+    start = time.perf_counter_ns()
+    try:
+        result = handler(command, repo)
+    except Exception:
+        METRICS.record(type(command), time.perf_counter_ns() - start, errors=1)
+        raise
+    METRICS.record(type(command), time.perf_counter_ns() - start)
+    return result
+
+def execute(
+    command: commands.Command,
+    repo: repositories.AbstractRepository,
+    log: wal.CommandLog,
+    command_handlers=COMMANDS_HANDLERS,
+):
+    """handle() a write and log it; the change is undone if either fails."""
+    with unit_of_work.UnitOfWork(repo, log) as uow:
+        result = handle(command, uow.repo, command_handlers)
+        uow.collect(command)
+        uow.commit()
     return result
 
-def load_data(repo: repositories.AbstractRepository):
-    if os.path.exists('pw5/student_mark/data/students.txt'):
-        with open('pw5/student_mark/data/students.txt', 'r') as file:
+def apply_batch(
+    cmds: list[commands.Command],
+    repo: repositories.AbstractRepository,
+    command_handlers=COMMANDS_HANDLERS,
+    batch_handlers=BATCH_HANDLERS,
+):
+    """Apply cmds grouped by type and by student.
+
+    Types run in BATCH_ORDER and, within a student, commands keep their
+    order. Returns a (result, error) pair per command and the successful
+    writes in the order they were applied, which is the order to log them.
+    """
+    groups = {}
+    for position, cmd in enumerate(cmds):
+        groups.setdefault(type(cmd), {}).setdefault(commands.student_id(cmd), []).append(position)
+
+    results = [None] * len(cmds)
+    written = []
+    for command_type in sorted(groups, key=lambda t: BATCH_ORDER.index(t) if t in BATCH_ORDER else len(BATCH_ORDER)):
+        for student_id, positions in groups[command_type].items():
+            if command_type in batch_handlers:
+                start = time.perf_counter_ns()
+                outcomes = batch_handlers[command_type](student_id, [cmds[p] for p in positions], repo)
+                if METRICS.enabled:
+                    # Each command is counted at its share of the batch's time.
+                    METRICS.record(
+                        command_type,
+                        (time.perf_counter_ns() - start) // len(positions),
+                        errors=sum(error is not None for _, error in outcomes),
+                        times=len(positions),
+                    )
+            else:
+                outcomes = []
+                for p in positions:
+                    try:
+                        outcomes.append((handle(cmds[p], repo, command_handlers), None))
+                    except (InvalidStudentId, InvalidCourseId, InvalidMark, InvalidPage, DuplicateStudentId) as e:
+                        outcomes.append((None, e))
+            for p, outcome in zip(positions, outcomes):
+                results[p] = outcome
+                if outcome[1] is None and command_type in DATA_FILES:
+                    written.append(cmds[p])
+    return results, written
+
+def handle_batch(
+    cmds: list[commands.Command],
+    repo: repositories.AbstractRepository,
+    log: wal.CommandLog = None,
+    command_handlers=COMMANDS_HANDLERS,
+    batch_handlers=BATCH_HANDLERS,
+):
+    """apply_batch in one unit of work: the successful writes are logged as one
+    record, and all undone if logging them fails."""
+    with unit_of_work.UnitOfWork(repo, log) as uow:
+        results, written = apply_batch(cmds, uow.repo, command_handlers, batch_handlers)
+        uow.collect(*written)
+        uow.commit()
+    return results
+
+def load_data(repo: repositories.AbstractRepository, archive=None):
+    with io.open_data_file('pw5/student_mark/data/students.txt', archive) as file:
+        if file is not None:
             for line in file:
                 data = line.strip().split(' ')
                 body = {
@@ -34,10 +205,10 @@ def load_data(repo: repositories.AbstractRepository):
                     'date_of_birth': data[2],
                 }
                 cmd = commands.CreateStudent(**body)
-                handle(cmd, repo)
+                handle(cmd, repo, REPLAY_HANDLERS)
 
-    if os.path.exists('pw5/student_mark/data/courses.txt'):
-        with open('pw5/student_mark/data/courses.txt', 'r') as file:
+    with io.open_data_file('pw5/student_mark/data/courses.txt', archive) as file:
+        if file is not None:
             for line in file:
                 data = line.strip().split(' ')
                 body = {
@@ -47,10 +218,10 @@ def load_data(repo: repositories.AbstractRepository):
                     'credit': int(data[3]),
                 }
                 cmd = commands.AddCourse(**body)
-                handle(cmd, repo)
+                handle(cmd, repo, REPLAY_HANDLERS)
     
-    if os.path.exists('pw5/student_mark/data/marks.txt'):
-        with open('pw5/student_mark/data/marks.txt', 'r') as file:
+    with io.open_data_file('pw5/student_mark/data/marks.txt', archive) as file:
+        if file is not None:
             for line in file:
                 data = line.strip().split(' ')
                 body = {
@@ -59,12 +230,46 @@ def load_data(repo: repositories.AbstractRepository):
                     'mark': float(data[2]),
                 }
                 cmd = commands.UpdateCourseMark(**body)
-                handle(cmd, repo)
+                handle(cmd, repo, REPLAY_HANDLERS)
+
+def open_repository(repository=repositories.LocalRepository):
+    """The data as of the last logged command: the snapshot if there is one,
+    else the archived text files loaded into a new repository, a
+    LocalRepository by default. The command log is replayed over either."""
+    if os.path.exists(SNAPSHOT_PATH):
+        repo = snapshot.SnapshotRepository(SNAPSHOT_PATH)
+        lsn = repo.lsn
+    else:
+        # Members are parsed as they stream out of student.dat; nothing is
+        # extracted to disk.
+        repo = repository([])
+        paths = {
+            'students': DATA_FILES[commands.CreateStudent][0],
+            'courses': DATA_FILES[commands.AddCourse][0],
+            'marks': DATA_FILES[commands.UpdateCourseMark][0],
+        }
+        if (os.cpu_count() or 1) > 1 and io.data_size(paths.values(), ARCHIVE_PATH) > PARALLEL_LOAD_THRESHOLD:
+            from student_mark.utils import loader
+
+            loader.load_parallel(repo, paths, archive=ARCHIVE_PATH)
+        else:
+            load_data(repo, archive=ARCHIVE_PATH)
+        lsn = archive_lsn()
+
+    # Replay commands logged after the last checkpoint.
+    for record_lsn, cmds in wal.read_log(LOG_PATH):
+        if record_lsn > lsn:
+            for cmd in cmds:
+                handle(cmd, repo, REPLAY_HANDLERS)
+    return repo
 
 def main():
-    repo = repositories.LocalRepository([])
-    io.decompress_files('pw5/student_mark/data/student.dat', 'pw5/student_mark/data')
-    load_data(repo)
+    repo = open_repository()
+    log = wal.CommandLog(LOG_PATH, lsn=archive_lsn())
+    # --metrics PATH writes per-command metrics to PATH, in the Prometheus
+    # text format, on exit.
+    metrics_path = sys.argv[sys.argv.index('--metrics') + 1] if '--metrics' in sys.argv else None
+    METRICS.enabled = metrics_path is not None
 
     while True:
         try:
@@ -74,15 +279,16 @@ def main():
             continue
 
         if choice == "0":
-            end_program()
+            if metrics_path is not None:
+                METRICS.dump(metrics_path)
+            end_program(repo, log, compact='--compact' in sys.argv)
 
         if choice == "1":
             try:
                 body = io.prompt_add_course()
                 cmd = commands.AddCourse(**body)
-                handle(cmd, repo)
-                io.write_to_file(body, f'pw5/student_mark/data/courses.txt')
-            except InvalidStudentId as e:
+                execute(cmd, repo, log)
+            except (InvalidStudentId, InvalidCourseId) as e:
                 print(str(e))
 
         if choice == "2":
@@ -94,10 +300,12 @@ def main():
                 print(str(e))
 
         if choice == "3":
-            body = io.prompt_create_student()
-            cmd = commands.CreateStudent(**body)
-            handle(cmd, repo)
-            io.write_to_file(body, f'pw5/student_mark/data/students.txt')
+            try:
+                body = io.prompt_create_student()
+                cmd = commands.CreateStudent(**body)
+                execute(cmd, repo, log)
+            except DuplicateStudentId as e:
+                print(str(e))
 
         if choice == "4":
             result = list_students(repo)
@@ -110,9 +318,8 @@ def main():
             try:
                 body = io.prompt_update_course_mark()
                 cmd = commands.UpdateCourseMark(**body)
-                handle(cmd, repo)
-                io.write_to_file(body, f'pw5/student_mark/data/marks.txt')
-            except (InvalidStudentId, InvalidCourseId) as e:
+                execute(cmd, repo, log)
+            except (InvalidStudentId, InvalidCourseId, InvalidMark) as e:
                 print(str(e))
 
         if choice == "6":
@@ -124,6 +331,18 @@ def main():
                 print(str(e))
             print(result)
 
+        if choice == "7":
+            try:
+                body = io.prompt_course_id()
+                students = handle(commands.ListCourseStudents(**body), repo)
+                if not students:
+                    raise InvalidCourseId(f"Invalid course ID {body['id']}")
+                body.update(io.prompt_course_marks(students))
+                cmd = commands.SetCourseMarks(**body)
+                execute(cmd, repo, log)
+            except (InvalidStudentId, InvalidCourseId, InvalidMark, ValueError) as e:
+                print(str(e))
+
 
 if __name__ == "__main__":
     main()
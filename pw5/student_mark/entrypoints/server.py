@@ -0,0 +1,199 @@
+"""Asyncio service exposing the command handlers over a JSON line protocol.
+
+Each request is one line, {"type": <command class name>, "body": {...}},
+the same shape the command log uses. Each response is one line,
+{"result": ..., "error": null} or {"result": null, "error": <message>}.
+
+Requests whose fields do not have the types their command declares are
+answered with an error before they reach a handler.
+
+Reads run in the event loop's thread pool, so a slow one does not hold
+up other clients. They share a readers/writer lock with the write
+batches, so they never see a write that is not yet logged or that is
+undone, and otherwise run side by side as far as the repository's lock()
+lets them. Writes go through a bounded queue to a single writer task
+that applies them in batches, also in the pool, and answers once they
+are logged; if a batch cannot be logged, its changes are undone and its
+clients get the error. A full queue stalls the clients sending writes
+until it drains. The log is synced after every batch unless
+--sync-every or --sync-interval let batches share a sync.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import typing
+from datetime import date
+from student_mark.adapters import repositories, wal
+from student_mark.domains import commands, models
+from student_mark.entrypoints.main import (
+    DATA_FILES,
+    LOG_PATH,
+    apply_batch,
+    archive_lsn,
+    checkpoint,
+    handle,
+    open_repository,
+)
+from student_mark.service_layer import unit_of_work
+from student_mark.service_layer.metrics import METRICS
+from student_mark.service_layer.handlers import InvalidCourseId, InvalidMark, InvalidPage, InvalidStudentId
+from student_mark.adapters.repositories import DuplicateStudentId
+
+# JSON types accepted for each command field type; dates travel as text.
+JSON_TYPES = {str: str, date: str, int: int, float: (int, float)}
+
+
+def valid(value, kind):
+    if typing.get_origin(kind) is dict:
+        key_kind, value_kind = typing.get_args(kind)
+        return isinstance(value, dict) and all(
+            valid(k, key_kind) and valid(v, value_kind) for k, v in value.items()
+        )
+    return not isinstance(value, bool) and isinstance(value, JSON_TYPES[kind])
+
+
+def check_fields(cmd: commands.Command):
+    for field in dataclasses.fields(cmd):
+        value = getattr(cmd, field.name)
+        if not valid(value, field.type):
+            raise TypeError(f"invalid {field.name} {value!r}")
+
+
+def to_json(value):
+    if isinstance(value, models.Student):
+        return {
+            "id": value.id,
+            "name": value.name,
+            "date_of_birth": value.date_of_birth,
+            "gpa": value.gpa(),
+        }
+    if isinstance(value, models.Course):
+        return {"id": value.id, "name": value.name, "credit": value.credit, "mark": value.mark}
+    return str(value)
+
+
+class Service:
+    def __init__(self, repo: repositories.AbstractRepository, log: wal.CommandLog, queue_size=1024, batch_size=512):
+        self.repo = repo
+        self.log = log
+        self.batch_size = batch_size
+        self._queue = asyncio.Queue(queue_size)
+        # Held exclusively by the writer from applying a batch until it is
+        # logged or undone, and shared by the reads.
+        self._lock = repositories.RWLock()
+
+    async def execute(self, cmd: commands.Command):
+        if type(cmd) not in DATA_FILES:
+            return await asyncio.get_running_loop().run_in_executor(None, self._read, cmd)
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((cmd, future))
+        result, error = await future
+        if error is not None:
+            raise error
+        return result
+
+    async def write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                results = await loop.run_in_executor(None, self._write, [cmd for cmd, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), outcome in zip(batch, results):
+                if not future.done():
+                    future.set_result(outcome)
+
+    def _read(self, cmd):
+        with self._lock.read():
+            return handle(cmd, self.repo)
+
+    def _write(self, cmds):
+        with self._lock.write():
+            with unit_of_work.UnitOfWork(self.repo, self.log) as uow:
+                results, written = apply_batch(cmds, uow.repo)
+                uow.collect(*written)
+                uow.commit()
+        return results
+
+    async def client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    cmd = wal.decode_command(json.loads(line))
+                    check_fields(cmd)
+                    response = {"result": await self.execute(cmd), "error": None}
+                # OSError: the batch this write was in could not be logged.
+                except (
+                    InvalidStudentId,
+                    InvalidCourseId,
+                    InvalidMark,
+                    InvalidPage,
+                    DuplicateStudentId,
+                    wal.CorruptLog,
+                    OSError,
+                ) as e:
+                    response = {"result": None, "error": str(e)}
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"result": None, "error": f"Invalid request: {e}"}
+                writer.write(json.dumps(response, default=to_json).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def dump_metrics(path, interval):
+    while True:
+        await asyncio.sleep(interval)
+        METRICS.dump(path)
+
+
+async def serve(service: Service, host, port, metrics_path=None, metrics_interval=15):
+    tasks = [asyncio.create_task(service.write_loop())]
+    if metrics_path is not None:
+        tasks.append(asyncio.create_task(dump_metrics(metrics_path, metrics_interval)))
+    server = await asyncio.start_server(service.client, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--metrics", help="file to write per-command metrics to, in the Prometheus text format")
+    parser.add_argument("--metrics-interval", type=float, default=15, help="seconds between metrics writes")
+    parser.add_argument("--sync-every", type=int, default=1, help="batches logged per sync of the command log")
+    parser.add_argument("--sync-interval", type=float, help="most seconds a logged batch waits to be synced")
+    args = parser.parse_args()
+
+    # Reads run in parallel threads, which a ConcurrentRepository keeps
+    # apart where they touch the same students.
+    repo = open_repository(repositories.ConcurrentRepository)
+    log = wal.CommandLog(LOG_PATH, args.sync_every, args.sync_interval, lsn=archive_lsn())
+    METRICS.enabled = args.metrics is not None
+    try:
+        asyncio.run(serve(Service(repo, log), args.host, args.port, args.metrics, args.metrics_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.metrics is not None:
+            METRICS.dump(args.metrics)
+        checkpoint(repo, log)
+        log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 from student_mark.domains import models, commands
 from student_mark.adapters import repositories
-import numpy as np
 import math
 
 
@@ -12,59 +11,233 @@ class InvalidStudentId(Exception):
     pass
 
 
+class InvalidMark(Exception):
+    pass
+
+
+class InvalidPage(Exception):
+    pass
+
+
+def floor_mark(mark):
+    """math.floor(mark), raising InvalidMark for anything but a finite number."""
+    try:
+        return math.floor(mark)
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidMark(f"Invalid mark {mark!r}")
+
+
 def create_student(cmd: commands.CreateStudent, repo: repositories.LocalRepository):
-    repo.add(models.Student(cmd.id, cmd.name, cmd.date_of_birth, courses=[]))
+    with repo.lock(cmd.id, exclusive=True):
+        repo.add(models.Student(cmd.id, cmd.name, cmd.date_of_birth, courses=[]))
 
 
-def add_course(cmd: commands.AddCourse, repo: repositories.LocalRepository):
-    student = repo.get(id=cmd.student_id)
-    if student is not None:
-        student.courses.append(models.Course(cmd.id, cmd.name, cmd.credit))
-    else:
-        raise InvalidStudentId(f"Invalid student ID {cmd.student_id}")
+def restore_student(cmd: commands.CreateStudent, repo: repositories.LocalRepository):
+    # Option 3 of the CLI used to store a student even when the id was
+    # taken, so stored data can repeat an id; the first record stands.
+    with repo.lock(cmd.id, exclusive=True):
+        if repo.get(id=cmd.id) is None:
+            repo.add(models.Student(cmd.id, cmd.name, cmd.date_of_birth, courses=[]))
+
+
+def catalog_entry(repo: repositories.AbstractRepository, id, name, credit):
+    """The catalog entry for a new enrollment; it has to match the course's definition."""
+    entry = repo.catalog.get(id)
+    if entry is None:
+        return repo.catalog.entry(id, name, credit)
+    if entry.name != name or entry.credit != credit:
+        raise InvalidCourseId(f"Course ID {id} is already {entry.name} with {entry.credit} credits")
+    return entry
+
+
+def stored_entry(repo: repositories.AbstractRepository, id, name, credit):
+    """The catalog entry for an enrollment loaded from stored data.
+
+    Data written before the catalog may define a course differently for
+    different students; such a definition is kept in an entry of its own.
+    """
+    return repo.catalog.entry(id, name, credit)
+
+
+def add_course(cmd: commands.AddCourse, repo: repositories.LocalRepository, entry=catalog_entry):
+    with repo.lock(cmd.student_id, exclusive=True):
+        student = repo.get(id=cmd.student_id)
+        if student is not None:
+            repo.add_course(student, models.Course(entry(repo, cmd.id, cmd.name, cmd.credit)))
+        else:
+            raise InvalidStudentId(f"Invalid student ID {cmd.student_id}")
+
+
+def restore_course(cmd: commands.AddCourse, repo: repositories.LocalRepository):
+    add_course(cmd, repo, entry=stored_entry)
 
 
 def list_student_courses(
     cmd: commands.ListStudentCourses, repo: repositories.LocalRepository
 ):
-    student = repo.get(id=cmd.id)
-    if student is not None:
-        return student.courses
-    else:
-        raise InvalidStudentId(f"Invalid student ID {cmd.id}")
+    with repo.lock(cmd.id):
+        student = repo.get(id=cmd.id)
+        if student is not None:
+            return list(student.courses)
+        else:
+            raise InvalidStudentId(f"Invalid student ID {cmd.id}")
+
+
+def list_course_students(
+    cmd: commands.ListCourseStudents, repo: repositories.LocalRepository
+):
+    with repo.lock(exclusive=True):
+        return repo.course_students(cmd.id)
 
 
 def list_students(repo: repositories.LocalRepository):
-    students = repo.list()
-    sorted_students = np.array(
-        sorted(
-            np.array(list(students), dtype=object),
-            key=lambda student: student.gpa(),
-            reverse=True,
-        ),
-        dtype=object,
-    )
-    return sorted_students
+    import numpy as np
+
+    with repo.lock(exclusive=True):
+        return np.asarray(repo.ranked(), dtype=object)
+
+
+def check_page(cmd: commands.ListTopStudents):
+    # A limit of 0 would hand back the cursor it was given, forever.
+    if cmd.limit < 1:
+        raise InvalidPage(f"Invalid limit {cmd.limit}")
+    if cmd.cursor < 0:
+        raise InvalidPage(f"Invalid cursor {cmd.cursor}")
+
+
+def list_top_students(cmd: commands.ListTopStudents, repo: repositories.LocalRepository):
+    check_page(cmd)
+    # One extra student tells whether there is a next page.
+    with repo.lock(exclusive=True):
+        students = repo.ranked(cmd.limit + 1, cmd.cursor)
+    next_cursor = cmd.cursor + cmd.limit if len(students) > cmd.limit else None
+    return students[: cmd.limit], next_cursor
 
 
 def update_course_mark(
     cmd: commands.UpdateCourseMark, repo: repositories.LocalRepository
 ):
-    student = repo.get(id=cmd.student_id)
-    if student is not None:
-        course = next((c for c in student.courses if c.id == cmd.id), None)
-        if course is not None:
-            course.mark = math.floor(cmd.mark)
+    with repo.lock(cmd.student_id, exclusive=True):
+        student = repo.get(id=cmd.student_id)
+        if student is not None:
+            course = next((c for c in student.courses if c.entry.id == cmd.id), None)
+            if course is not None:
+                repo.update_course_mark(student, course, floor_mark(cmd.mark))
+            else:
+                raise InvalidCourseId(f"Invalid course ID {cmd.id}")
         else:
+            raise InvalidStudentId(f"Invalid student ID {cmd.student_id}")
+
+
+def update_course_marks(
+    student_id, cmds: list[commands.UpdateCourseMark], repo: repositories.LocalRepository
+):
+    # Batch form of update_course_mark for one student: the student and its
+    # courses are looked up once for all of cmds. Returns a (result, error)
+    # pair per command.
+    with repo.lock(student_id, exclusive=True):
+        student = repo.get(id=student_id)
+        if student is None:
+            return [(None, InvalidStudentId(f"Invalid student ID {student_id}")) for _ in cmds]
+
+        courses = {}
+        for course in reversed(student.courses):
+            courses[course.id] = course
+        results = []
+        for cmd in cmds:
+            course = courses.get(cmd.id)
+            if course is None:
+                results.append((None, InvalidCourseId(f"Invalid course ID {cmd.id}")))
+                continue
+            try:
+                repo.update_course_mark(student, course, floor_mark(cmd.mark))
+                results.append((None, None))
+            except InvalidMark as e:
+                results.append((None, e))
+    return results
+
+
+def check_course_marks(cmd: commands.SetCourseMarks, repo: repositories.LocalRepository):
+    """The students, courses and floored marks cmd sets, raising if any is invalid."""
+    enrolled = {student.id: student for student in repo.course_students(cmd.id)}
+    students, courses = [], []
+    for student_id in cmd.marks:
+        student = enrolled.get(student_id)
+        if student is None:
+            if repo.get(id=student_id) is None:
+                raise InvalidStudentId(f"Invalid student ID {student_id}")
             raise InvalidCourseId(f"Invalid course ID {cmd.id}")
-    else:
-        raise InvalidStudentId(f"Invalid student ID {cmd.course_id}")
+        students.append(student)
+        courses.append(next(c for c in student.courses if c.entry.id == cmd.id))
+    return students, courses, [floor_mark(mark) for mark in cmd.marks.values()]
+
+
+def set_course_marks(cmd: commands.SetCourseMarks, repo: repositories.LocalRepository):
+    # update_course_mark for a whole roster: every student and mark is
+    # checked before any mark changes, then they are set in one call.
+    with repo.lock(exclusive=True):
+        repo.update_course_marks(*check_course_marks(cmd, repo))
+
+
+GPA_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def summarize_gpas(total_credits, weighted_sums, bins=10):
+    """GPA distribution of the students in credit_totals() arrays.
+
+    Students without credits are counted but left out of the statistics.
+    The credit-weighted figures weigh each unrounded GPA by the student's
+    credits, so their mean is the cohort's average mark per credit.
+    """
+    import numpy as np
+
+    enrolled = total_credits != 0
+    credits = total_credits[enrolled]
+    sums = weighted_sums[enrolled]
+    gpas = repositories.gpas_from_totals(credits, sums)
+    counts, edges = np.histogram(gpas, bins=bins)
+    summary = {
+        "students": len(total_credits),
+        "enrolled": len(gpas),
+        "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+        "mean": 0.0,
+        "std": 0.0,
+        "min": 0.0,
+        "max": 0.0,
+        "credit_weighted": {"credits": float(credits.sum()), "mean": 0.0, "std": 0.0},
+    }
+    summary.update({f"p{percent}": 0.0 for percent in GPA_PERCENTILES})
+    if len(gpas):
+        weighted_mean = sums.sum() / credits.sum()
+        summary.update(
+            mean=float(gpas.mean()),
+            std=float(gpas.std()),
+            min=float(gpas.min()),
+            max=float(gpas.max()),
+        )
+        deviations = sums / credits - weighted_mean
+        summary["credit_weighted"].update(
+            mean=float(weighted_mean),
+            std=float(np.sqrt(np.average(deviations**2, weights=credits))),
+        )
+        percentiles = np.percentile(gpas, GPA_PERCENTILES)
+        summary.update(
+            {f"p{percent}": float(value) for percent, value in zip(GPA_PERCENTILES, percentiles)}
+        )
+    return summary
+
+
+def gpa_distribution(cmd: commands.GPADistribution, repo: repositories.LocalRepository):
+    with repo.lock(exclusive=True):
+        total_credits, weighted_sums = repo.credit_totals()
+    return summarize_gpas(total_credits, weighted_sums, cmd.bins)
 
 
 def calculate_gpa(cmd: commands.CalculateGPA, repo: repositories.LocalRepository):
-    student = repo.get(id=cmd.id)
-    if student is not None:
-        return student.gpa()
+    with repo.lock(cmd.id):
+        gpa = repo.gpa(cmd.id)
+    if gpa is not None:
+        return gpa
     else:
         raise InvalidStudentId(f"Invalid student ID {cmd.id}")
 
@@ -73,6 +246,21 @@ COMMANDS_HANDLERS = {
     commands.CreateStudent: create_student,
     commands.AddCourse: add_course,
     commands.ListStudentCourses: list_student_courses,
+    commands.ListCourseStudents: list_course_students,
     commands.UpdateCourseMark: update_course_mark,
+    commands.SetCourseMarks: set_course_marks,
     commands.CalculateGPA: calculate_gpa,
+    commands.ListTopStudents: list_top_students,
+    commands.GPADistribution: gpa_distribution,
+}
+
+# Handlers for replaying stored data: the text files and the command log.
+REPLAY_HANDLERS = {
+    **COMMANDS_HANDLERS,
+    commands.CreateStudent: restore_student,
+    commands.AddCourse: restore_course,
+}
+
+BATCH_HANDLERS = {
+    commands.UpdateCourseMark: update_course_marks,
 }
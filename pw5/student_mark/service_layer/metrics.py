@@ -0,0 +1,171 @@
+"""Per-command counters, error counts and latency histograms.
+
+handle() and apply_batch() record into METRICS when it is enabled; when
+it is not, they check one attribute and move on. Latencies go into
+log-linear buckets in the style of HdrHistogram: each power of two of
+nanoseconds is split into 2 ** SUB_BUCKET_BITS equal buckets, so any
+value is known to within 12.5% at a fixed, small cost per record.
+
+The data can be read as a dict with snapshot(), or written in the
+Prometheus text format with dump(), e.g. for node_exporter's textfile
+collector.
+"""
+import os
+import threading
+import time
+
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Enough buckets for anything below 2 ** 40 ns, about 18 minutes.
+BUCKETS = (40 - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+# Bucket bounds exported to Prometheus: powers of two from about 1 µs
+# to 17 s. They fall on fine bucket boundaries, so the counts are exact.
+EXPORT_BOUNDS = [1 << exponent for exponent in range(10, 35)]
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_upper_bound(index):
+    """Smallest value above everything that falls in bucket index."""
+    if index < SUB_BUCKETS:
+        return index + 1
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return (SUB_BUCKETS + (index & (SUB_BUCKETS - 1)) + 1) << shift
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value, times=1):
+        # bucket_index(), inlined: this runs once per handled command.
+        if value < SUB_BUCKETS:
+            index = value
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS - 1
+            index = ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKETS
+            if index >= BUCKETS:
+                index = BUCKETS - 1
+        self.counts[index] += times
+        self.count += times
+        self.total += value * times
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the given percentile, 0 when empty."""
+        if self.count == 0:
+            return 0
+        target = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds):
+        """Number of values below each of bounds, which must be ascending."""
+        counts, seen, index = [], 0, 0
+        for bound in bounds:
+            while index < BUCKETS and bucket_upper_bound(index) <= bound:
+                seen += self.counts[index]
+                index += 1
+            counts.append(seen)
+        return counts
+
+
+class CommandStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._since = time.monotonic()
+
+    def record(self, command_type, elapsed_ns, errors=0, times=1):
+        """Count times commands of command_type, errors of them failed, that took elapsed_ns each."""
+        with self._lock:
+            stats = self._stats.get(command_type)
+            if stats is None:
+                stats = self._stats[command_type] = CommandStats()
+            stats.count += times
+            stats.errors += errors
+            stats.latency.record(elapsed_ns, times)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._since
+            commands = {}
+            for command_type, stats in self._stats.items():
+                latency = stats.latency
+                summary = {
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "per_second": stats.count / elapsed if elapsed else 0.0,
+                    "mean_us": latency.total / latency.count / 1000 if latency.count else 0.0,
+                    "max_us": latency.max / 1000,
+                }
+                for percent in PERCENTILES:
+                    summary[f"p{percent:g}_us"] = latency.percentile(percent) / 1000
+                commands[command_type.__name__] = summary
+            return {"seconds": elapsed, "commands": commands}
+
+    def prometheus(self):
+        lines = [
+            "# HELP student_mark_commands_total Commands handled.",
+            "# TYPE student_mark_commands_total counter",
+        ]
+        with self._lock:
+            stats = sorted(self._stats.items(), key=lambda item: item[0].__name__)
+            for command_type, command in stats:
+                lines.append(f'student_mark_commands_total{{command="{command_type.__name__}"}} {command.count}')
+            lines += [
+                "# HELP student_mark_command_errors_total Commands that failed.",
+                "# TYPE student_mark_command_errors_total counter",
+            ]
+            for command_type, command in stats:
+                lines.append(f'student_mark_command_errors_total{{command="{command_type.__name__}"}} {command.errors}')
+            lines += [
+                "# HELP student_mark_command_duration_seconds Time spent handling commands.",
+                "# TYPE student_mark_command_duration_seconds histogram",
+            ]
+            for command_type, command in stats:
+                label = f'command="{command_type.__name__}"'
+                latency = command.latency
+                for bound, count in zip(EXPORT_BOUNDS, latency.cumulative(EXPORT_BOUNDS)):
+                    lines.append(
+                        f'student_mark_command_duration_seconds_bucket{{{label},le="{bound / 1e9:g}"}} {count}'
+                    )
+                lines.append(f'student_mark_command_duration_seconds_bucket{{{label},le="+Inf"}} {latency.count}')
+                lines.append(f"student_mark_command_duration_seconds_sum{{{label}}} {latency.total / 1e9:g}")
+                lines.append(f"student_mark_command_duration_seconds_count{{{label}}} {latency.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Write prometheus() to path, replacing it atomically."""
+        with open(f"{path}.tmp", "w") as file:
+            file.write(self.prometheus())
+        os.replace(f"{path}.tmp", path)
+
+
+METRICS = Metrics()
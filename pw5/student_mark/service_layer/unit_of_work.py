@@ -0,0 +1,183 @@
+"""Unit of work: changes from many handlers, logged and kept, or undone, together.
+
+Handlers run against uow.repo, which passes every call through to the
+real repository and remembers how to undo each change. commit() writes
+the collected commands to the command log as one record; the log frames
+and checksums each record, so it is replayed whole or not at all. When
+the record reaches disk is up to the log's sync_every and sync_interval,
+unless the unit of work is durable, which syncs it on commit. rollback(),
+or leaving the with block without a commit, undoes the changes in
+reverse order.
+
+Entering the with block calls the repository's begin(), and commit() and
+rollback() end what it started. A repository that writes through to
+storage, like SqliteRepository, keeps the whole unit in one transaction,
+so a crash part way through stores none of it.
+"""
+import abc
+from student_mark.adapters import repositories, wal
+from student_mark.domains import commands
+
+
+class TrackingCatalog:
+    """The repository's catalog, remembering the entries it adds so a revert forgets them."""
+
+    def __init__(self, tracking: "TrackingRepository"):
+        self._tracking = tracking
+        self._catalog = tracking.repo.catalog
+
+    def get(self, id):
+        return self._catalog.get(id)
+
+    def entry(self, id, name, credit):
+        new = self._catalog.get(id) is None
+        entry = self._catalog.entry(id, name, credit)
+        if new:
+            self._tracking.undo += ("forget", None, None, entry, None)
+        return entry
+
+    def forget(self, entry):
+        self._catalog.forget(entry)
+
+
+class TrackingRepository(repositories.AbstractRepository):
+    # Each change pushes (undo operation, student id, student, course, mark)
+    # onto one flat list rather than a closure or a tuple, so a big batch
+    # does not hand the garbage collector an object per change to scan.
+    FIELDS = 5
+
+    def __init__(self, repo: repositories.AbstractRepository):
+        self.repo = repo
+        self.catalog = TrackingCatalog(self)
+        self.undo = []
+
+    def add(self, student):
+        self.repo.add(student)
+        self.undo += ("remove", student.id, student, None, None)
+
+    def get(self, id):
+        return self.repo.get(id)
+
+    def begin(self):
+        self.repo.begin()
+
+    def commit(self):
+        self.repo.commit()
+        self.undo = []
+
+    def rollback(self):
+        self.repo.rollback()
+
+    def list(self):
+        return self.repo.list()
+
+    def remove(self, id):
+        student = self.repo.get(id)
+        self.repo.remove(id)
+        self.undo += ("add", id, student, None, None)
+
+    def lock(self, student_id=None, exclusive=False):
+        return self.repo.lock(student_id, exclusive)
+
+    def add_course(self, student, course):
+        self.repo.add_course(student, course)
+        self.undo += ("remove_course", student.id, student, course, None)
+
+    def remove_course(self, student, course):
+        self.repo.remove_course(student, course)
+        self.undo += ("add_course", student.id, student, course, None)
+
+    def update_course_mark(self, student, course, mark):
+        previous = course.mark
+        self.repo.update_course_mark(student, course, mark)
+        self.undo += ("update_course_mark", student.id, student, course, previous)
+
+    def update_course_marks(self, students, courses, marks):
+        previous = [course.mark for course in courses]
+        self.repo.update_course_marks(students, courses, marks)
+        for student, course, mark in zip(students, courses, previous):
+            self.undo += ("update_course_mark", student.id, student, course, mark)
+
+    def gpas(self):
+        return self.repo.gpas()
+
+    def credit_totals(self):
+        return self.repo.credit_totals()
+
+    def gpa(self, student_id):
+        return self.repo.gpa(student_id)
+
+    def course_students(self, course_id):
+        return self.repo.course_students(course_id)
+
+    def ranked(self, limit=None, offset=0):
+        return self.repo.ranked(limit, offset)
+
+    def revert(self):
+        """Undo the tracked changes, newest first, and forget them."""
+        undo, self.undo = self.undo, []
+        for end in range(len(undo), 0, -self.FIELDS):
+            operation, student_id, student, course, mark = undo[end - self.FIELDS : end]
+            with self.repo.lock(student_id, exclusive=True):
+                if operation == "remove":
+                    self.repo.remove(student_id)
+                elif operation == "add":
+                    self.repo.add(student)
+                elif operation == "remove_course":
+                    self.repo.remove_course(student, course)
+                elif operation == "add_course":
+                    self.repo.add_course(student, course)
+                elif operation == "forget":
+                    # course holds the catalog entry.
+                    self.repo.catalog.forget(course)
+                else:
+                    self.repo.update_course_mark(student, course, mark)
+
+
+class AbstractUnitOfWork(abc.ABC):
+    repo: repositories.AbstractRepository
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.rollback()
+
+    @abc.abstractmethod
+    def commit(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def rollback(self):
+        raise NotImplementedError
+
+
+class UnitOfWork(AbstractUnitOfWork):
+    def __init__(
+        self, repo: repositories.AbstractRepository, log: wal.CommandLog = None, durable=False
+    ):
+        self.repo = TrackingRepository(repo)
+        self.log = log
+        self.durable = durable
+        self.commands = []
+
+    def __enter__(self):
+        self.repo.begin()
+        return super().__enter__()
+
+    def collect(self, *cmds: commands.Command):
+        """Queue cmds to be logged by the next commit()."""
+        self.commands.extend(cmds)
+
+    def commit(self):
+        if self.log is not None and self.commands:
+            self.log.append(*self.commands)
+            if self.durable:
+                self.log.sync()
+        self.commands = []
+        self.repo.commit()
+
+    def rollback(self):
+        self.repo.revert()
+        self.repo.rollback()
+        self.commands = []
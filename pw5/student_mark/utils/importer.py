@@ -0,0 +1,174 @@
+"""Streaming import of students, courses and marks from CSV or JSONL files.
+
+Rows are validated and applied straight to the repository a chunk at a
+time, without building commands or going through handle(). Bad rows are
+reported and skipped.
+"""
+import csv
+import dataclasses
+import itertools
+import json
+import math
+from typing import Callable, List, Optional
+from student_mark.adapters import repositories
+from student_mark.adapters.repositories import DuplicateStudentId
+from student_mark.domains import models
+from student_mark.service_layer.handlers import (
+    InvalidCourseId,
+    InvalidStudentId,
+    catalog_entry,
+    stored_entry,
+)
+
+
+def parse_credit(value):
+    # JSON numbers arrive as floats or bools; int() would truncate 3.7 to 3.
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    return int(value)
+
+
+def parse_mark(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    mark = float(value)
+    if not math.isfinite(mark):
+        raise ValueError(value)
+    return mark
+
+
+# Columns each kind of file must provide, with the function each is parsed with.
+FIELDS = {
+    "students": {"id": str, "name": str, "date_of_birth": str},
+    "courses": {"student_id": str, "id": str, "name": str, "credit": parse_credit},
+    "marks": {"student_id": str, "id": str, "mark": parse_mark},
+}
+
+
+@dataclasses.dataclass
+class RowError:
+    line: int
+    message: str
+
+
+@dataclasses.dataclass
+class ImportReport:
+    rows: int = 0
+    applied: int = 0
+    error_count: int = 0
+    errors: List[RowError] = dataclasses.field(default_factory=list)
+
+
+def read_rows(path):
+    """Yield (line number, row dict) from a .csv file with a header or a .jsonl file."""
+    with open(path, "r", newline="") as file:
+        if path.endswith(".jsonl"):
+            for line_number, line in enumerate(file, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError as e:
+                        yield line_number, e
+        else:
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def validate(kind, row):
+    if not isinstance(row, dict):
+        raise ValueError(f"Unreadable row: {row}")
+    values = []
+    for name, parse in FIELDS[kind].items():
+        if row.get(name) in (None, ""):
+            raise ValueError(f"Missing {name}")
+        try:
+            values.append(parse(row[name]))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {name} {row[name]!r}")
+    return values
+
+
+def apply_student(repo, id, name, date_of_birth):
+    repo.add(models.Student(id, name, date_of_birth, courses=[]))
+
+
+def restore_student(repo, id, name, date_of_birth):
+    # Stored data can repeat a student id; the first record stands.
+    if repo.get(id=id) is None:
+        apply_student(repo, id, name, date_of_birth)
+
+
+def apply_course(repo, student_id, id, name, credit, entry=catalog_entry):
+    student = repo.get(id=student_id)
+    if student is None:
+        raise InvalidStudentId(f"Invalid student ID {student_id}")
+    repo.add_course(student, models.Course(entry(repo, id, name, credit)))
+
+
+def restore_course(repo, student_id, id, name, credit):
+    apply_course(repo, student_id, id, name, credit, entry=stored_entry)
+
+
+def apply_mark(repo, student_id, id, mark):
+    student = repo.get(id=student_id)
+    if student is None:
+        raise InvalidStudentId(f"Invalid student ID {student_id}")
+    course = next((c for c in student.courses if c.entry.id == id), None)
+    if course is None:
+        raise InvalidCourseId(f"Invalid course ID {id}")
+    repo.update_course_mark(student, course, math.floor(mark))
+
+
+APPLY = {
+    "students": apply_student,
+    "courses": apply_course,
+    "marks": apply_mark,
+}
+
+
+def import_file(
+    path,
+    kind,
+    repo: repositories.AbstractRepository,
+    chunk_size=10000,
+    max_errors=1000,
+    progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """Import every row of path as kind ("students", "courses" or "marks").
+
+    At most max_errors RowErrors are kept; error_count counts all of them.
+    progress, if given, is called with the running report after each chunk.
+    """
+    report = ImportReport()
+
+    def record(line, message):
+        report.error_count += 1
+        if len(report.errors) < max_errors:
+            report.errors.append(RowError(line, message))
+
+    rows = read_rows(path)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return report
+        report.rows += len(chunk)
+
+        lines, valid = [], []
+        for line, row in chunk:
+            try:
+                valid.append(validate(kind, row))
+                lines.append(line)
+            except ValueError as e:
+                record(line, str(e))
+
+        apply = APPLY[kind]
+        for line, values in zip(lines, valid):
+            try:
+                apply(repo, *values)
+                report.applied += 1
+            except (DuplicateStudentId, InvalidStudentId, InvalidCourseId) as e:
+                record(line, str(e))
+
+        if progress is not None:
+            progress(report)
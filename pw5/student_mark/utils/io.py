@@ -1,5 +1,18 @@
-import zipfile
+import contextlib
+import copy
+import struct
+import sys
+import zlib
 import os
+from io import BytesIO, TextIOWrapper
+
+# zipfile and concurrent.futures are imported where they are used: the
+# CLI reaches its first prompt without touching either.
+
+# _copy_member sets ZipFile's private state, which is as it expects from
+# Python 3.10 through 3.13. Elsewhere compress_files compresses every
+# member afresh through the public API.
+RAW_COPY = (3, 10) <= sys.version_info[:2] <= (3, 13)
 
 class InvalidChoice(Exception):
     pass
@@ -17,10 +30,11 @@ def prompt():
 4. List student(s).
 5. Update course mark for a student.
 6. Calculate GPA of a student
+7. Input marks of a course for its students.
 =======================================
 """
     )
-    VALID_CHOICES = ["0", "1", "2", "3", "4", "5", "6"]
+    VALID_CHOICES = ["0", "1", "2", "3", "4", "5", "6", "7"]
     choice = input()
     if choice in VALID_CHOICES:
         return choice
@@ -67,32 +81,258 @@ def prompt_update_course_mark():
     return {"student_id": student_id, "id": id, "mark": mark}
 
 
+def prompt_course_id():
+    print("Course ID:")
+    id = str(input())
+    return {"id": id}
+
+
+def prompt_course_marks(students):
+    marks = {}
+    for index, student in enumerate(students, start=1):
+        print(f"{index}. ID: {student.id} Name: {student.name}")
+        marks[student.id] = float(input())
+    return {"marks": marks}
+
+
 def prompt_calculate_gpa():
     print("ID:")
     id = str(input)
 
     return {"id": id}
 
-def write_to_file(data, filename):
-    try:
-        with open(filename, 'a') as file:
+def append_to_file(rows, filename):
+    if os.path.exists(filename) and not os.path.exists(index_path(filename)):
+        build_index(filename)
+    entries = []
+    with open(filename, 'a') as file:
+        for data in rows:
+            offset = file.tell()
             for value in data.values():
                 file.write(f"{value} ")
             file.write('\n')
-    except Exception as e:
-        print(f'Error writing to file: {e}')    
+            entries.append(f"{next(iter(data.values()))} {offset}\n")
+    with open(index_path(filename), 'a') as file:
+        file.writelines(entries)
 
-def compress_files(file_paths, zip_name):
-    with zipfile.ZipFile(zip_name, 'w') as zipf:
-        for file_path in file_paths:
-            if os.path.exists(file_path):
-                zipf.write(file_path, os.path.basename(file_path))
+def rewrite_file(rows, filename):
+    """Atomically replace filename, and its index, with rows."""
+    entries = []
+    with open(f"{filename}.tmp", 'w') as file:
+        for data in rows:
+            offset = file.tell()
+            for value in data.values():
+                file.write(f"{value} ")
+            file.write('\n')
+            entries.append(f"{next(iter(data.values()))} {offset}\n")
+        file.flush()
+        os.fsync(file.fileno())
+    with open(f"{index_path(filename)}.tmp", 'w') as file:
+        file.writelines(entries)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(f"{filename}.tmp", filename)
+    os.replace(f"{index_path(filename)}.tmp", index_path(filename))
+
+def index_path(filename):
+    return f"{filename}.idx"
+
+def build_index(filename):
+    index = {}
+    with open(filename, 'rb') as file, open(index_path(filename), 'w') as index_file:
+        offset = 0
+        for line in file:
+            key = line.decode().strip().split(' ')[0]
+            if key:
+                index.setdefault(key, []).append(offset)
+                index_file.write(f"{key} {offset}\n")
+            offset += len(line)
+    return index
+
+def load_index(filename):
+    """Map the first column of each line in filename to its byte offsets.
+
+    The index lives in a sidecar file kept up to date by append_to_file
+    and rewrite_file. It is rebuilt when it is missing or does not end
+    where filename ends.
+    """
+    if not os.path.exists(filename):
+        return {}
+    if not os.path.exists(index_path(filename)):
+        return build_index(filename)
+
+    index = {}
+    last_offset = None
+    with open(index_path(filename), 'r') as file:
+        for line in file:
+            key, offset = line.split()
+            last_offset = int(offset)
+            index.setdefault(key, []).append(last_offset)
+
+    with open(filename, 'rb') as file:
+        if last_offset is None:
+            end = 0
+        else:
+            file.seek(last_offset)
+            file.readline()
+            end = file.tell()
+        if end != os.fstat(file.fileno()).st_size:
+            return build_index(filename)
+    return index
+
+def read_line_at(file, offset):
+    file.seek(offset)
+    return file.readline().decode().strip().split(' ')
+
+def compress_files(file_paths, zip_name, comment=b'', compression=None, compresslevel=None, workers=None):
+    """Archive file_paths into zip_name, reusing members whose content is unchanged.
+
+    Unchanged members are copied over still compressed; the others are
+    compressed in parallel threads with the given codec, stored by
+    default, and level. Nothing is written when no member and not the
+    comment changed. Without RAW_COPY, every member is compressed again,
+    one after another.
+    """
+    import zipfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    if compression is None:
+        compression = zipfile.ZIP_STORED
+    file_paths = [file_path for file_path in file_paths if os.path.exists(file_path)]
+    existing = {}
+    old_comment = None
+    if os.path.exists(zip_name):
+        with zipfile.ZipFile(zip_name, 'r') as zipf:
+            existing = {info.filename: info for info in zipf.infolist()}
+            old_comment = zipf.comment
+
+    changed = []
+    for file_path in file_paths:
+        info = existing.get(os.path.basename(file_path))
+        if info is None or info.compress_type != compression or not matches_member(file_path, info):
+            changed.append(file_path)
+    names = [os.path.basename(file_path) for file_path in file_paths]
+    if not changed and comment == old_comment and sorted(names) == sorted(existing):
+        return
+    if not RAW_COPY:
+        with zipfile.ZipFile(f"{zip_name}.tmp", 'w', compression, compresslevel=compresslevel) as zipf:
+            zipf.comment = comment
+            for file_path, name in zip(file_paths, names):
+                zipf.write(file_path, name)
+        os.replace(f"{zip_name}.tmp", zip_name)
+        return
+
+    def compress(file_path):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression, compresslevel=compresslevel) as zipf:
+            zipf.write(file_path, os.path.basename(file_path))
+        return buffer
+
+    with ThreadPoolExecutor(workers) as pool:
+        compressed = dict(zip(changed, pool.map(compress, changed)))
+
+    with contextlib.ExitStack() as stack:
+        old = stack.enter_context(zipfile.ZipFile(zip_name, 'r')) if existing else None
+        zipf = stack.enter_context(zipfile.ZipFile(f"{zip_name}.tmp", 'w'))
+        zipf.comment = comment
+        for file_path, name in zip(file_paths, names):
+            if file_path in compressed:
+                with zipfile.ZipFile(compressed[file_path], 'r') as member_zip:
+                    _copy_member(member_zip, member_zip.getinfo(name), zipf)
+            else:
+                _copy_member(old, existing[name], zipf)
+    os.replace(f"{zip_name}.tmp", zip_name)
+
+def _copy_member(source, info, target):
+    # zipfile cannot add already compressed data, so this writes the local
+    # header and raw bytes itself and registers the entry the way
+    # ZipFile.write does. Only used when RAW_COPY.
+    import zipfile
+
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+    data = source.fp.read(info.compress_size)
+
+    info = copy.copy(info)
+    info.flag_bits &= ~0x08
+    info.header_offset = target.fp.tell()
+    target.fp.write(info.FileHeader())
+    target.fp.write(data)
+    target.filelist.append(info)
+    target.NameToInfo[info.filename] = info
+    target.start_dir = target.fp.tell()
+    target._didModify = True
 
 def decompress_files(zip_name, extract_dir):
+    import zipfile
+
     if os.path.exists(zip_name):
         with zipfile.ZipFile(zip_name, 'r') as zipf:
             for file_info in zipf.infolist():
                 target_path = os.path.join(extract_dir, file_info.filename)
                 if os.path.exists(target_path):
+                    if matches_member(target_path, file_info):
+                        continue
                     os.remove(target_path)  # Remove existing file
                 zipf.extract(file_info.filename, extract_dir)
+
+def matches_member(path, file_info):
+    if os.path.getsize(path) != file_info.file_size:
+        return False
+    crc = 0
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            crc = zlib.crc32(block, crc)
+    return crc == file_info.CRC
+
+@contextlib.contextmanager
+def open_data_file(path, zip_name=None):
+    """Open a data file as text, streamed out of zip_name when that archive exists.
+
+    Yields None when the file is not there.
+    """
+    import zipfile
+
+    if zip_name is not None and os.path.exists(zip_name):
+        with zipfile.ZipFile(zip_name, 'r') as zipf:
+            try:
+                member = zipf.open(os.path.basename(path))
+            except KeyError:
+                yield None
+                return
+            with member, TextIOWrapper(member) as file:
+                yield file
+    elif os.path.exists(path):
+        with open(path, 'r') as file:
+            yield file
+    else:
+        yield None
+
+def data_size(paths, zip_name=None):
+    """Uncompressed size of the data files, as open_data_file would read them."""
+    import zipfile
+
+    if zip_name is not None and os.path.exists(zip_name):
+        with zipfile.ZipFile(zip_name, 'r') as zipf:
+            sizes = {info.filename: info.file_size for info in zipf.infolist()}
+        return sum(sizes.get(os.path.basename(path), 0) for path in paths)
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+def read_archive_comment(zip_name):
+    # Read straight from the end of central directory record, so checking
+    # the archive's lsn on startup does not import zipfile. The record is
+    # 22 bytes, ending with the comment length, and the comment follows.
+    if not os.path.exists(zip_name):
+        return b''
+    with open(zip_name, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        file.seek(max(0, file.tell() - 22 - 0xFFFF))
+        tail = file.read()
+    start = len(tail)
+    while (start := tail.rfind(b'PK\x05\x06', 0, start)) >= 0:
+        (length,) = struct.unpack('<H', tail[start + 20:start + 22])
+        if start + 22 + length == len(tail):
+            return tail[start + 22:]
+    return b''
@@ -0,0 +1,71 @@
+import zipfile
+import pytest
+from student_mark.utils import io
+
+CODECS = [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA]
+
+
+def _files(tmp_path, contents):
+    paths = []
+    for name, data in contents.items():
+        path = tmp_path / name
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths
+
+
+def _extracted(archive, extract_dir):
+    io.decompress_files(str(archive), str(extract_dir))
+    return {path.name: path.read_bytes() for path in extract_dir.iterdir()}
+
+
+CONTENTS = {
+    "students.txt": b"S1 Alice 2000-01-01 \nS2 Bob 2001-02-03 \n" * 500,
+    "courses.txt": b"S1 C1 Math 3 \n" * 700,
+    "marks.txt": b"",
+}
+
+
+@pytest.fixture(params=[True, False], ids=["raw copy", "recompress"])
+def raw_copy(request, monkeypatch):
+    monkeypatch.setattr(io, "RAW_COPY", request.param)
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_round_trip(tmp_path, compression, raw_copy):
+    paths = _files(tmp_path, CONTENTS)
+    archive = tmp_path / "student.dat"
+    io.compress_files(paths, str(archive), comment=b"lsn=7", compression=compression)
+
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        assert {info.compress_type for info in zipf.infolist()} == {compression}
+    assert io.read_archive_comment(str(archive)) == b"lsn=7"
+    assert _extracted(archive, tmp_path / "out") == CONTENTS
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_unchanged_members_are_copied(tmp_path, compression, raw_copy):
+    paths = _files(tmp_path, CONTENTS)
+    archive = tmp_path / "student.dat"
+    io.compress_files(paths, str(archive), comment=b"lsn=1", compression=compression)
+    (tmp_path / "marks.txt").write_bytes(b"S1 C1 15.0 \n")
+    io.compress_files(paths, str(archive), comment=b"lsn=2", compression=compression)
+
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.namelist() == list(CONTENTS)
+    assert io.read_archive_comment(str(archive)) == b"lsn=2"
+    assert _extracted(archive, tmp_path / "out") == dict(CONTENTS, **{"marks.txt": b"S1 C1 15.0 \n"})
+
+
+def test_codec_change_recompresses(tmp_path, raw_copy):
+    paths = _files(tmp_path, CONTENTS)
+    archive = tmp_path / "student.dat"
+    io.compress_files(paths, str(archive), compression=zipfile.ZIP_STORED)
+    io.compress_files(paths, str(archive), compression=zipfile.ZIP_DEFLATED)
+
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        assert {info.compress_type for info in zipf.infolist()} == {zipfile.ZIP_DEFLATED}
+    assert _extracted(archive, tmp_path / "out") == CONTENTS
@@ -0,0 +1,104 @@
+import os
+import pytest
+from student_mark.adapters import repositories, snapshot, wal
+from student_mark.domains import commands
+from student_mark.entrypoints import main
+from student_mark.service_layer.handlers import InvalidCourseId
+from student_mark.utils import loader
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    # The data paths are relative to the repository root.
+    os.makedirs(tmp_path / os.path.dirname(main.ARCHIVE_PATH))
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _session(cmds):
+    repo = main.open_repository()
+    log = wal.CommandLog(main.LOG_PATH, lsn=main.archive_lsn())
+    for cmd in cmds:
+        main.execute(cmd, repo, log)
+    return repo, log
+
+
+def _state(repo):
+    return sorted(
+        (student.id, sorted((course.id, course.mark) for course in student.courses))
+        for student in repo.list()
+    )
+
+
+CMDS = [
+    commands.CreateStudent("S1", "Alice", "2000-01-01"),
+    commands.AddCourse("C1", "S1", "Math", 3),
+    commands.UpdateCourseMark("C1", "S1", 15.5),
+]
+
+
+def test_checkpoint_records_lsn_and_empties_log(root):
+    repo, log = _session(CMDS)
+    main.checkpoint(repo, log)
+    log.close()
+
+    assert main.archive_lsn() == 3
+    assert list(wal.read_log(main.LOG_PATH)) == []
+    os.remove(main.SNAPSHOT_PATH)
+    assert _state(main.open_repository()) == [("S1", [("C1", 15)])]
+
+
+def _crash(self):
+    raise OSError("crash")
+
+
+def test_checkpoint_interrupted_before_log_reset_is_idempotent(root, monkeypatch):
+    repo, log = _session(CMDS)
+    with monkeypatch.context() as patch:
+        patch.setattr(wal.CommandLog, "reset", _crash)
+        with pytest.raises(OSError):
+            main.checkpoint(repo, log)
+    log.close()
+    assert len(list(wal.read_log(main.LOG_PATH))) == 3
+
+    # The log is replayed over the archive and the snapshot, which
+    # already include its records.
+    repo, log = _session([])
+    assert _state(repo) == [("S1", [("C1", 15)])]
+    main.checkpoint(repo, log)
+    log.close()
+
+    with open(main.DATA_FILES[commands.AddCourse][0]) as file:
+        assert len(file.readlines()) == 1
+    os.remove(main.SNAPSHOT_PATH)
+    assert _state(main.open_repository()) == [("S1", [("C1", 15)])]
+
+
+def test_course_definitions_are_checked_after_checkpoint(root):
+    repo, log = _session(CMDS + [commands.CreateStudent("S2", "Bob", "2001-01-01")])
+    main.checkpoint(repo, log)
+    log.close()
+
+    repo, log = _session([])
+    assert isinstance(repo, snapshot.SnapshotRepository)
+    with pytest.raises(InvalidCourseId):
+        main.execute(commands.AddCourse("C1", "S2", "Physics", 4), repo, log)
+    main.execute(commands.AddCourse("C1", "S2", "Math", 3), repo, log)
+    log.close()
+    assert repo.get("S2").courses[0].entry is repo.get("S1").courses[0].entry
+
+
+def test_repeated_student_ids_in_stored_data_keep_the_first(root):
+    students, courses = (main.DATA_FILES[cmd][0] for cmd in (commands.CreateStudent, commands.AddCourse))
+    with open(students, "w") as file:
+        file.write("S1 Alice 2000-01-01 \nS1 Alicia 2002-02-02 \nS2 Bob 2001-01-01 \n")
+    with open(courses, "w") as file:
+        file.write("S1 C1 Math 3 \n")
+
+    expected = [("S1", "Alice", ["C1"]), ("S2", "Bob", [])]
+    repo = main.open_repository()
+    assert [(s.id, s.name, [c.id for c in s.courses]) for s in repo.list()] == expected
+
+    repo = repositories.LocalRepository([])
+    loader.load_parallel(repo, {"students": students, "courses": courses}, workers=2)
+    assert [(s.id, s.name, [c.id for c in s.courses]) for s in repo.list()] == expected
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from student_mark.adapters import repositories
+from student_mark.domains import commands, models
+from student_mark.entrypoints.main import handle
+from student_mark.service_layer.handlers import GPA_PERCENTILES, InvalidMark
+
+
+def _student(id, enrollments):
+    return models.Student(
+        id,
+        f"Name{id}",
+        "2000-01-01",
+        courses=[
+            models.Course(models.CatalogEntry(f"C{i}", f"Course{i}", credit), mark)
+            for i, (credit, mark) in enumerate(enrollments)
+        ],
+    )
+
+
+@pytest.mark.parametrize("repository", [repositories.LocalRepository, repositories.ColumnarRepository])
+def test_gpa_distribution_matches_calculate_gpa(repository):
+    # GPAs ending in .x5 once divided out, where rounding can go either way.
+    students = [
+        _student(f"S{total}-{weighted}", [(1, weighted), (total - 1, 0)])
+        for total in range(1, 60)
+        for weighted in range(0, 2 * total)
+        if (weighted * 20) % total == 0 and (weighted * 20 // total) % 2
+    ]
+    students.append(_student("A", [(1, 3), (19, 0)]))
+    repo = repository(students)
+
+    gpas = [handle(commands.CalculateGPA(student.id), repo) for student in students]
+    assert gpas == [student.gpa() for student in students]
+    summary = handle(commands.GPADistribution(), repo)
+    assert (summary["min"], summary["max"]) == (min(gpas), max(gpas))
+    percentiles = np.percentile(gpas, GPA_PERCENTILES).tolist()
+    assert [summary[f"p{percent}"] for percent in GPA_PERCENTILES] == percentiles
+
+
+def test_gpa_distribution_of_one_student():
+    repo = repositories.LocalRepository([_student("A", [(1, 3), (19, 0)])])
+    summary = handle(commands.GPADistribution(), repo)
+    assert summary["min"] == summary["max"] == handle(commands.CalculateGPA("A"), repo) == 0.1
+
+
+@pytest.mark.parametrize("mark", [float("nan"), float("inf"), "18", None])
+def test_set_course_marks_rejects_what_update_course_mark_rejects(mark):
+    repo = repositories.LocalRepository([_student("S0", [(3, 12)]), _student("S1", [(3, 12)])])
+    for cmd in (
+        commands.UpdateCourseMark("C0", "S1", mark),
+        commands.SetCourseMarks("C0", {"S0": 5, "S1": mark}),
+    ):
+        with pytest.raises(InvalidMark):
+            handle(cmd, repo)
+    assert [course.mark for student in repo.list() for course in student.courses] == [12, 12]
+
+
+@pytest.mark.parametrize("repository", [repositories.LocalRepository, repositories.ColumnarRepository])
+def test_set_course_marks_floors_like_update_course_mark(repository):
+    marks = {"S0": 1e20, "S1": -2.5, "S2": 17.9}
+    repo = repository([_student(id, [(3, 0)]) for id in marks])
+    handle(commands.SetCourseMarks("C0", marks), repo)
+    expected = repository([_student(id, [(3, 0)]) for id in marks])
+    for id, mark in marks.items():
+        handle(commands.UpdateCourseMark("C0", id, mark), expected)
+
+    assert [s.courses[0].mark for s in repo.list()] == [10**20, -3, 17]
+    assert [s.courses[0].mark for s in expected.list()] == [10**20, -3, 17]
+    assert repo.gpas().tolist() == expected.gpas().tolist()
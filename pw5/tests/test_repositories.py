@@ -0,0 +1,68 @@
+import pytest
+from student_mark.adapters import repositories, snapshot
+from student_mark.domains import models
+from student_mark.service_layer.handlers import list_students
+
+
+def _student(id, enrollments):
+    return models.Student(
+        id,
+        f"Name{id}",
+        "2000-01-01",
+        courses=[
+            models.Course(models.CatalogEntry(f"C{i}", f"Course{i}", credit), mark)
+            for i, (credit, mark) in enumerate(enrollments)
+        ],
+    )
+
+
+def _half_students():
+    # Weighted sums over credit totals below 60 whose GPA, times ten, ends
+    # in .5 or close to it, where np.round and round can disagree.
+    students = []
+    for total in range(1, 60):
+        for weighted in range(0, 20 * total):
+            if (weighted * 20) % total in (0, total - 1, 1) and (weighted * 20 // total) % 2:
+                students.append(_student(f"S{len(students)}", [(1, weighted), (total - 1, 0)]))
+    return students
+
+
+def _snapshot(tmp_path, students):
+    path = tmp_path / "student.snap"
+    snapshot.write_snapshot(repositories.LocalRepository(students), str(path))
+    return snapshot.SnapshotRepository(str(path))
+
+
+REPOSITORIES = {
+    "local": lambda tmp_path, students: repositories.LocalRepository(students),
+    "columnar": lambda tmp_path, students: repositories.ColumnarRepository(students),
+    "snapshot": _snapshot,
+}
+
+
+@pytest.mark.parametrize("kind", REPOSITORIES)
+def test_gpas_round_like_student_gpa(tmp_path, kind):
+    repo = REPOSITORIES[kind](tmp_path, _half_students())
+    assert repo.gpas().tolist() == [student.gpa() for student in repo.list()]
+
+
+@pytest.mark.parametrize("kind", REPOSITORIES)
+def test_ranking_follows_student_gpa(tmp_path, kind):
+    a = _student("A", [(1, 3), (19, 0)])
+    b = _student("B", [(1, 2), (9, 0)])
+    assert (a.gpa(), b.gpa()) == (0.1, 0.2)
+
+    repo = REPOSITORIES[kind](tmp_path, [a, b])
+    assert [student.id for student in list_students(repo)] == ["B", "A"]
+
+
+def test_lazy_text_catalog_knows_unloaded_students_courses(tmp_path):
+    (tmp_path / "students.txt").write_text("S1 Alice 2000-01-01 \nS2 Bob 2001-01-01 \n")
+    (tmp_path / "courses.txt").write_text("S1 C1 Math 3 \nS2 C1 Physics 4 \n")
+    repo = repositories.LazyTextRepository(str(tmp_path))
+
+    entry = repo.catalog.get("C1")
+    assert (entry.name, entry.credit) == ("Math", 3)
+    assert repo.get("S1").courses[0].entry is entry
+    assert repo.get("S2").courses[0].entry is not entry
+    repo.close()
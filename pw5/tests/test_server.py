@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import pytest
+from student_mark.adapters import repositories, wal
+from student_mark.domains import commands
+from student_mark.entrypoints import server
+from student_mark.entrypoints.main import handle, handle_batch
+from student_mark.service_layer import handlers
+
+
+def _service(tmp_path, log_class=wal.CommandLog):
+    repo = repositories.ConcurrentRepository([])
+    handle_batch(
+        [
+            commands.CreateStudent("S1", "Alice", "2000-01-01"),
+            commands.AddCourse("C1", "S1", "Math", 3),
+            commands.UpdateCourseMark("C1", "S1", 15),
+        ],
+        repo,
+    )
+    return server.Service(repo, log_class(str(tmp_path / "commands.log")))
+
+
+def test_slow_read_does_not_hold_up_other_reads(tmp_path, monkeypatch):
+    service = _service(tmp_path)
+    release = threading.Event()
+
+    def slow_distribution(cmd, repo):
+        assert release.wait(5)
+        return handlers.gpa_distribution(cmd, repo)
+
+    monkeypatch.setitem(handlers.COMMANDS_HANDLERS, commands.GPADistribution, slow_distribution)
+
+    async def run():
+        slow = asyncio.create_task(service.execute(commands.GPADistribution()))
+        await asyncio.sleep(0)
+        gpa = await asyncio.wait_for(service.execute(commands.CalculateGPA("S1")), 5)
+        release.set()
+        return gpa, (await slow)["max"]
+
+    assert asyncio.run(run()) == (15.0, 15.0)
+
+
+def test_read_does_not_see_a_batch_being_logged(tmp_path):
+    appending, release = threading.Event(), threading.Event()
+
+    class BlockingLog(wal.CommandLog):
+        def append(self, *cmds):
+            appending.set()
+            assert release.wait(5)
+            raise OSError("disk full")
+
+    service = _service(tmp_path, BlockingLog)
+
+    async def run():
+        writer = asyncio.create_task(service.write_loop())
+        write = asyncio.create_task(service.execute(commands.UpdateCourseMark("C1", "S1", 2)))
+        await asyncio.get_running_loop().run_in_executor(None, appending.wait, 5)
+        read = asyncio.create_task(service.execute(commands.CalculateGPA("S1")))
+        await asyncio.sleep(0.05)
+        assert not read.done()
+        release.set()
+        with pytest.raises(OSError):
+            await write
+        writer.cancel()
+        return await read
+
+    assert asyncio.run(run()) == 15.0
@@ -0,0 +1,136 @@
+import pytest
+from student_mark.adapters import repositories
+from student_mark.adapters.sharding import ShardedRepository, shard_of
+from student_mark.domains import commands
+from student_mark.entrypoints.main import handle, handle_batch
+from student_mark.service_layer.handlers import (
+    InvalidCourseId,
+    InvalidMark,
+    InvalidStudentId,
+    list_students,
+)
+
+SHARDS = 3
+
+
+@pytest.fixture
+def sharded():
+    with ShardedRepository(SHARDS) as repo:
+        yield repo
+
+
+def _enrolled(repo, ids):
+    cmds = []
+    for id in ids:
+        cmds += [
+            commands.CreateStudent(id, f"Name{id}", "2000-01-01"),
+            commands.AddCourse("C1", id, "Math", 3),
+            commands.UpdateCourseMark("C1", id, 12),
+        ]
+    assert all(error is None for _, error in repo.handle_many(cmds))
+
+
+def _two_shards():
+    # Two ids, each on a shard of its own.
+    ids = [f"S{i}" for i in range(20)]
+    other = next(id for id in ids if shard_of(id, SHARDS) != shard_of(ids[0], SHARDS))
+    return ids[0], other
+
+
+@pytest.mark.parametrize(
+    "mark, enrolled, error",
+    [
+        ("x", True, InvalidMark),
+        (float("nan"), True, InvalidMark),
+        (7, None, InvalidStudentId),
+        (7, False, InvalidCourseId),
+    ],
+)
+def test_set_course_marks_changes_nothing_if_a_shard_rejects_its_part(sharded, mark, enrolled, error):
+    first, other = _two_shards()
+    _enrolled(sharded, [first])
+    if enrolled:
+        _enrolled(sharded, [other])
+    elif enrolled is False:
+        sharded.handle(commands.CreateStudent(other, "Name", "2000-01-01"))
+
+    with pytest.raises(error):
+        sharded.handle(commands.SetCourseMarks("C1", {first: 5, other: mark}))
+    assert sharded.handle(commands.CalculateGPA(first)) == 12.0
+    if enrolled:
+        assert sharded.handle(commands.CalculateGPA(other)) == 12.0
+
+
+def test_set_course_marks_across_shards(sharded):
+    first, other = _two_shards()
+    _enrolled(sharded, [first, other])
+    sharded.handle(commands.SetCourseMarks("C1", {first: 5.5, other: 7}))
+    assert sharded.handle(commands.CalculateGPA(first)) == 5.0
+    assert sharded.handle(commands.CalculateGPA(other)) == 7.0
+
+
+def _cohort():
+    # Many ties, so the merge has to keep creation order across shards.
+    cmds = []
+    for i in range(40):
+        id = f"S{i}"
+        cmds.append(commands.CreateStudent(id, f"Name{i}", "2000-01-01"))
+        if i % 5:
+            cmds.append(commands.AddCourse("C1", id, "Math", 3))
+            cmds.append(commands.UpdateCourseMark("C1", id, (i * 7) % 4 + 10))
+        if i % 3 == 0:
+            cmds.append(commands.AddCourse("C2", id, "Physics", 1))
+            cmds.append(commands.UpdateCourseMark("C2", id, i % 20))
+    return cmds
+
+
+@pytest.fixture
+def both(sharded):
+    local = repositories.LocalRepository([])
+    assert all(error is None for _, error in sharded.handle_many(_cohort()))
+    assert all(error is None for _, error in handle_batch(_cohort(), local))
+    return sharded, local
+
+
+def _ids(students):
+    return [student.id for student in students]
+
+
+def test_merged_ranking_matches_one_repository(both):
+    sharded, local = both
+    assert _ids(sharded.list_students()) == _ids(list_students(local))
+    for limit in (1, 7, 40, 50):
+        assert _ids(sharded.list_students(limit)) == _ids(list_students(local))[:limit]
+    assert sharded.gpa_distribution() == handle(commands.GPADistribution(), local)
+
+
+@pytest.mark.parametrize("limit", [1, 6, 39, 40, 41])
+def test_list_top_students_pages_match_one_repository(both, limit):
+    sharded, local = both
+    pages = {}
+    for name, run in (("sharded", sharded.handle), ("local", lambda cmd: handle(cmd, local))):
+        cursor, pages[name] = 0, []
+        while cursor is not None:
+            students, cursor = run(commands.ListTopStudents(limit, cursor))
+            pages[name].append((_ids(students), cursor))
+    assert pages["sharded"] == pages["local"]
+
+
+def test_ranking_in_a_batch_sees_the_writes_before_it(both):
+    sharded, local = both
+    cmds = [
+        commands.UpdateCourseMark("C1", "S1", 20),
+        commands.ListTopStudents(3, 0),
+        commands.CreateStudent("S99", "New", "2000-01-01"),
+        commands.AddCourse("C1", "S99", "Math", 3),
+        commands.UpdateCourseMark("C1", "S99", 19),
+        commands.ListTopStudents(3, 1),
+    ]
+    results = sharded.handle_many(cmds)
+    expected = [
+        handle(cmd, local) if isinstance(cmd, commands.ListTopStudents) else handle_batch([cmd], local)
+        for cmd in cmds
+    ]
+    for position in (1, 5):
+        students, cursor = results[position][0]
+        assert (_ids(students), cursor) == (_ids(expected[position][0]), expected[position][1])
@@ -0,0 +1,111 @@
+import pytest
+from student_mark.adapters import repositories, snapshot
+from student_mark.domains import commands
+from student_mark.entrypoints.main import handle, handle_batch
+
+# Ids in no particular order, some prefixes of others, one not ASCII.
+IDS = ["S2", "S10", "S1", "Z", "A7", "S100", "É3"]
+
+
+def _state(repo):
+    return [
+        (
+            s.id,
+            s.name,
+            str(s.date_of_birth),
+            [(c.id, c.name, c.credit, c.mark) for c in s.courses],
+            s.gpa(),
+        )
+        for s in repo.list()
+    ]
+
+
+@pytest.fixture
+def local():
+    repo = repositories.LocalRepository([])
+    cmds = []
+    for i, id in enumerate(IDS):
+        cmds.append(commands.CreateStudent(id, f"Name{i}", f"200{i}-01-01"))
+        for course in range(i % 3):
+            cmds.append(commands.AddCourse(f"C{course}", id, f"Course{course}", course + 2))
+            cmds.append(commands.UpdateCourseMark(f"C{course}", id, 7 + i + course))
+    assert all(error is None for _, error in handle_batch(cmds, repo))
+    return repo
+
+
+@pytest.fixture
+def reopen(tmp_path):
+    opened = []
+
+    def reopen(repo, lsn=0):
+        path = str(tmp_path / f"student{len(opened)}.snap")
+        snapshot.write_snapshot(repo, path, lsn=lsn)
+        opened.append(snapshot.SnapshotRepository(path))
+        return opened[-1]
+
+    yield reopen
+    for repo in opened:
+        repo.close()
+
+
+def test_round_trip(local, reopen):
+    repo = reopen(local, lsn=42)
+    assert repo.lsn == 42
+    assert not repo.modified
+    assert _state(repo) == _state(local)
+    assert repo.gpas().tolist() == local.gpas().tolist()
+    assert [total.tolist() for total in repo.credit_totals()] == [
+        total.tolist() for total in local.credit_totals()
+    ]
+
+
+def test_get_finds_each_id_by_binary_search(local, reopen):
+    repo = reopen(local)
+    # Ask in a different order from the one written, before list() has
+    # loaded anything.
+    for id in sorted(IDS, reverse=True):
+        assert repo.get(id).id == id
+        assert _state(repositories.LocalRepository([repo.get(id)])) == _state(
+            repositories.LocalRepository([local.get(id)])
+        )
+    for missing in ["", "0", "S", "S0", "S11", "S3", "ZZ", "É"]:
+        assert repo.get(missing) is None
+
+
+def test_empty_snapshot(reopen):
+    repo = reopen(repositories.LocalRepository([]))
+    assert repo.list() == []
+    assert repo.get("S1") is None
+    assert repo.gpas().tolist() == []
+
+
+def test_credit_totals_follow_changes_to_loaded_students(local, reopen):
+    repo = reopen(local)
+    cmds = [
+        commands.UpdateCourseMark("C1", "S100", 19),
+        commands.AddCourse("C5", "S1", "Course5", 4),
+        commands.UpdateCourseMark("C5", "S1", 11),
+        commands.CreateStudent("N1", "New", "2010-01-01"),
+        commands.AddCourse("C0", "N1", "Course0", 2),
+        commands.UpdateCourseMark("C0", "N1", 3),
+    ]
+    for results in (handle_batch(cmds, repo), handle_batch(cmds, local)):
+        assert all(error is None for _, error in results)
+
+    assert repo.modified
+    assert _state(repo) == _state(local)
+    assert [total.tolist() for total in repo.credit_totals()] == [
+        total.tolist() for total in local.credit_totals()
+    ]
+    assert repo.gpas().tolist() == [student.gpa() for student in repo.list()]
+    assert handle(commands.GPADistribution(), repo) == handle(commands.GPADistribution(), local)
+
+    # The changes survive a rewrite of the snapshot.
+    assert _state(reopen(repo)) == _state(local)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "student.snap"
+    path.write_bytes(b"not a snapshot" * 10)
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.SnapshotRepository(str(path))
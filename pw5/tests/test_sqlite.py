@@ -0,0 +1,89 @@
+import pytest
+from student_mark.adapters import repositories, sqlite
+from student_mark.domains import commands
+from student_mark.entrypoints.main import handle, handle_batch
+
+
+def _commands():
+    # Ties, students without courses and GPAs that round on a half.
+    cmds = []
+    for i, (marks, credits) in enumerate(
+        [
+            ([3, 0], [1, 19]),
+            ([2, 0], [1, 9]),
+            ([15], [3]),
+            ([], []),
+            ([15], [4]),
+            ([14, 16], [2, 2]),
+            ([], []),
+            ([7, 8, 9], [1, 2, 3]),
+            ([1, 0], [1, 1]),
+            ([5], [2]),
+        ]
+    ):
+        id = f"S{i}"
+        cmds.append(commands.CreateStudent(id, f"Name{i}", "2000-01-01"))
+        for course, (mark, credit) in enumerate(zip(marks, credits)):
+            cmds.append(commands.AddCourse(f"C{course}-{credit}", id, f"Course{course}", credit))
+            cmds.append(commands.UpdateCourseMark(f"C{course}-{credit}", id, mark))
+    return cmds
+
+
+@pytest.fixture
+def repos(tmp_path):
+    path = str(tmp_path / "students.db")
+    repo = sqlite.SqliteRepository(path)
+    local = repositories.LocalRepository([])
+    for results in (handle_batch(_commands(), repo), handle_batch(_commands(), local)):
+        assert all(error is None for _, error in results)
+    repo.close()
+    # Read back from the database rather than the identity map.
+    repo = sqlite.SqliteRepository(path)
+    yield repo, local
+    repo.close()
+
+
+def _ids(students):
+    return [student.id for student in students]
+
+
+def test_ranking_matches_local_repository(repos):
+    repo, local = repos
+    assert _ids(repo.ranked()) == _ids(local.ranked())
+    assert repo.gpas().tolist() == local.gpas().tolist()
+    assert [total.tolist() for total in repo.credit_totals()] == [
+        total.tolist() for total in local.credit_totals()
+    ]
+    for student in local.list():
+        assert repo.gpa(student.id) == student.gpa()
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 10, 20])
+def test_pages_match_local_repository(repos, limit):
+    repo, local = repos
+    for offset in range(0, 12):
+        assert _ids(repo.ranked(limit, offset)) == _ids(local.ranked(limit, offset))
+
+    pages = {}
+    for name, r in (("sqlite", repo), ("local", local)):
+        cursor, pages[name] = 0, []
+        while cursor is not None:
+            students, cursor = handle(commands.ListTopStudents(limit, cursor), r)
+            pages[name].append(_ids(students))
+    assert pages["sqlite"] == pages["local"]
+    assert sum(pages["sqlite"], []) == _ids(local.ranked())
+
+
+def test_ranking_follows_changes(repos):
+    repo, local = repos
+    cmds = [
+        commands.UpdateCourseMark("C0-3", "S2", 2),
+        commands.AddCourse("C0-1", "S3", "Course0", 1),
+        commands.UpdateCourseMark("C0-1", "S3", 20),
+        commands.SetCourseMarks("C0-1", {"S0": 9, "S1": 9}),
+    ]
+    for r in (repo, local):
+        assert all(error is None for _, error in handle_batch(cmds, r))
+    assert _ids(repo.ranked()) == _ids(local.ranked())
+    assert _ids(repo.ranked(3, 2)) == _ids(local.ranked(3, 2))
+    assert handle(commands.GPADistribution(), repo) == handle(commands.GPADistribution(), local)
@@ -0,0 +1,139 @@
+import pytest
+from student_mark.adapters import repositories, sqlite, wal
+from student_mark.domains import commands
+from student_mark.entrypoints import main
+from student_mark.service_layer import unit_of_work
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = wal.CommandLog(str(tmp_path / "commands.log"), sync_every=3)
+    yield log
+    log.close()
+
+
+def _create(log, id, durable=False):
+    with unit_of_work.UnitOfWork(repositories.LocalRepository([]), log, durable) as uow:
+        main.handle(commands.CreateStudent(id, "Name", "2000-01-01"), uow.repo)
+        uow.collect(commands.CreateStudent(id, "Name", "2000-01-01"))
+        uow.commit()
+
+
+def test_commit_leaves_syncing_to_the_log(log):
+    _create(log, "S1")
+    _create(log, "S2")
+    assert log._pending == 2
+    _create(log, "S3")
+    assert log._pending == 0
+
+
+def test_durable_commit_syncs(log):
+    _create(log, "S1", durable=True)
+    assert log._pending == 0
+
+
+class FailingLog:
+    def append(self, *cmds):
+        raise OSError("disk full")
+
+
+def _sqlite(tmp_path, students):
+    repo = sqlite.SqliteRepository(str(tmp_path / "students.db"))
+    for student in students:
+        repo.add(student)
+    return repo
+
+
+REPOSITORIES = {
+    "local": lambda tmp_path, students: repositories.LocalRepository(students),
+    "columnar": lambda tmp_path, students: repositories.ColumnarRepository(students, capacity=2),
+    "concurrent": lambda tmp_path, students: repositories.ConcurrentRepository(students),
+    "sqlite": _sqlite,
+}
+
+
+def _state(repo):
+    return (
+        [
+            (s.id, [(c.id, c.name, c.credit, c.mark) for c in s.courses], s.gpa())
+            for s in repo.list()
+        ],
+        repo.gpas().tolist(),
+        [total.tolist() for total in repo.credit_totals()],
+        [s.id for s in repo.ranked()],
+        [s.id for s in repo.course_students("C1")],
+    )
+
+
+BATCH = [
+    commands.CreateStudent("S3", "Carol", "2002-01-01"),
+    commands.CreateStudent("S4", "Dan", "2003-01-01"),
+    commands.AddCourse("C1", "S3", "Math", 3),
+    commands.AddCourse("C9", "S4", "Art", 2),
+    commands.AddCourse("C9", "S1", "Art", 2),
+    commands.UpdateCourseMark("C1", "S1", 2),
+    commands.UpdateCourseMark("C1", "S3", 19),
+    commands.UpdateCourseMark("C9", "S4", 11),
+    commands.SetCourseMarks("C1", {"S1": 4, "S2": 6, "S3": 8}),
+]
+
+
+@pytest.mark.parametrize("kind", REPOSITORIES)
+def test_failed_log_reverts_batch(tmp_path, kind):
+    repo = REPOSITORIES[kind](tmp_path, [])
+    setup = [
+        commands.CreateStudent("S1", "Alice", "2000-01-01"),
+        commands.CreateStudent("S2", "Bob", "2001-01-01"),
+        commands.AddCourse("C1", "S1", "Math", 3),
+        commands.AddCourse("C2", "S1", "Physics", 4),
+        commands.AddCourse("C1", "S2", "Math", 3),
+        commands.UpdateCourseMark("C1", "S1", 15),
+        commands.UpdateCourseMark("C2", "S1", 9),
+        commands.UpdateCourseMark("C1", "S2", 12),
+    ]
+    assert all(error is None for _, error in main.handle_batch(setup, repo))
+    before = _state(repo)
+
+    with pytest.raises(OSError):
+        main.handle_batch(BATCH, repo, FailingLog())
+    assert _state(repo) == before
+    # The course the batch catalogued is forgotten with it.
+    assert repo.catalog.get("C9") is None
+    main.handle(commands.AddCourse("C9", "S2", "Music", 1), repo)
+
+    # The reverted repository takes the same batch as a fresh one.
+    (tmp_path / "fresh").mkdir()
+    fresh = REPOSITORIES[kind](tmp_path / "fresh", [])
+    main.handle_batch(setup + [commands.AddCourse("C9", "S2", "Music", 1)], fresh)
+    batch = [cmd for cmd in BATCH if cmd.id != "C9"]
+    outcomes = [main.handle_batch(batch, r) for r in (repo, fresh)]
+    assert [[type(error) for _, error in results] for results in outcomes] == [[type(None)] * len(batch)] * 2
+    assert _state(repo) == _state(fresh)
+
+
+@pytest.mark.parametrize("kind", REPOSITORIES)
+def test_revert_of_remove_keeps_gpas_in_line(tmp_path, kind):
+    repo = REPOSITORIES[kind](tmp_path, [])
+    cmds = []
+    for i, mark in enumerate([15, 9, 12]):
+        cmds += [
+            commands.CreateStudent(f"S{i}", "Name", "2000-01-01"),
+            commands.AddCourse("C1", f"S{i}", "Math", 3),
+            commands.UpdateCourseMark("C1", f"S{i}", mark),
+        ]
+    main.handle_batch(cmds, repo)
+
+    with unit_of_work.UnitOfWork(repo) as uow:
+        uow.repo.remove("S0")
+        assert repo.gpas().tolist() == [9.0, 12.0]
+        uow.rollback()
+    # The student comes back at the end of list().
+    assert sorted(zip(repo.gpas().tolist(), (s.id for s in repo.list()))) == [
+        (9.0, "S1"),
+        (12.0, "S2"),
+        (15.0, "S0"),
+    ]
+    assert repo.gpas().tolist() == [student.gpa() for student in repo.list()]
+    main.handle(commands.UpdateCourseMark("C1", "S0", 3), repo)
+    assert repo.gpa("S0") == 3.0
+    assert sorted(repo.gpas().tolist()) == [3.0, 9.0, 12.0]
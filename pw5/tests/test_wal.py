@@ -0,0 +1,59 @@
+import os
+from student_mark.adapters import wal
+from student_mark.domains import commands
+
+
+def _write(path, count):
+    log = wal.CommandLog(str(path))
+    for i in range(count):
+        log.append(commands.CreateStudent(f"S{i}", f"Student{i}", "2000-01-01"))
+    log.close()
+
+
+def _ids(path):
+    return [cmd.id for _, cmds in wal.read_log(str(path)) for cmd in cmds]
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    path = tmp_path / "commands.log"
+    _write(path, 3)
+    size = os.path.getsize(path)
+    with open(path, "r+b") as file:
+        file.truncate(size - 5)
+
+    log = wal.CommandLog(str(path))
+    assert log.lsn == 2
+    assert log.append(commands.CreateStudent("S9", "Student9", "2000-01-01")) == 3
+    log.close()
+    assert _ids(path) == ["S0", "S1", "S9"]
+
+
+def test_corrupt_record_drops_it_and_everything_after(tmp_path):
+    path = tmp_path / "commands.log"
+    _write(path, 3)
+    with open(path, "rb") as file:
+        data = bytearray(file.read())
+        file.seek(0)
+        # End of the first record, where the second one starts.
+        second = next(offset for _, _, offset in wal._scan(file))
+    data[second + wal.RECORD_HEADER.size + 2] ^= 0xFF
+    with open(path, "wb") as file:
+        file.write(data)
+
+    assert _ids(path) == ["S0"]
+    log = wal.CommandLog(str(path))
+    assert log.lsn == 1
+    log.close()
+    assert os.path.getsize(path) == second
+
+
+def test_garbage_after_last_record_is_dropped(tmp_path):
+    path = tmp_path / "commands.log"
+    _write(path, 2)
+    size = os.path.getsize(path)
+    with open(path, "ab") as file:
+        file.write(b"\x01\x02\x03")
+
+    wal.CommandLog(str(path)).close()
+    assert os.path.getsize(path) == size
+    assert _ids(path) == ["S0", "S1"]